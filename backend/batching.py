@@ -0,0 +1,109 @@
+"""Cross-session micro-batching for YOLO phone detection.
+
+Sessions call `YoloBatcher.detect(frame)` from their executor threads. A single
+scheduler thread collects pending frames until it has `max_batch` of them, or
+every registered session is waiting, or `max_wait_ms` has passed since the
+first frame arrived, then runs one batched YOLO call and hands each session
+its own box list.
+
+Each session has at most one frame in `detect` at a time, so per-session
+ordering is kept. With a single connected device the batch is complete as
+soon as its frame arrives, so it never waits for the deadline.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from ultralytics import YOLO
+
+from focus_analyzer import YOLO_WEIGHTS, PHONE_CLASS, PHONE_CONF, phone_boxes
+
+
+class YoloBatcher:
+    def __init__(self, yolo_weights=YOLO_WEIGHTS, max_batch=8, max_wait_ms=4.0, concurrency=None):
+        self.max_batch = max(1, max_batch)
+        # how many sessions can be inside detect() at once (executor threads)
+        self.concurrency = concurrency
+        self.max_wait = max_wait_ms / 1000.0
+        self.yolo = YOLO(yolo_weights)
+
+        self._queue = queue.Queue()
+        self._sessions = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.batches = 0
+        self.frames = 0
+
+        self._thread = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+        self._thread.start()
+
+    def register(self):
+        with self._lock:
+            self._sessions += 1
+
+    def unregister(self):
+        with self._lock:
+            self._sessions = max(0, self._sessions - 1)
+
+    def detect(self, frame):
+        """Blocking: returns [(x1, y1, x2, y2), ...] phone boxes for `frame`."""
+        fut = Future()
+        self._queue.put((frame, fut))
+        return fut.result()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            with self._lock:
+                waiting_for = self._sessions
+            if self.concurrency:
+                waiting_for = min(waiting_for, self.concurrency)
+            if len(batch) >= waiting_for:
+                # every active session already has its frame in this batch
+                break
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._closed = True
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while not self._closed:
+            batch = self._collect()
+            if batch is None:
+                break
+            frames = [frame for frame, _ in batch]
+            try:
+                results = self.yolo(frames, classes=[PHONE_CLASS], conf=PHONE_CONF, verbose=False)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.frames += len(batch)
+            for (_, fut), result in zip(batch, results):
+                fut.set_result(phone_boxes(result))
+
+        # fail whatever is still queued so no session blocks forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("YoloBatcher closed"))
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
@@ -1,26 +1,133 @@
-import cv2
 import mediapipe as mp
 import numpy as np
 from ultralytics import YOLO
 from collections import deque
 import math
+import threading
+from contextlib import contextmanager
+from metrics import metrics
+from overlay import KEY_LANDMARKS, draw_overlay
+from phone_scheduler import PhoneDetectionScheduler
 #from picamera2 import Picamera2
 
+YOLO_WEIGHTS = 'face_tracking/yolov8n.pt'
+PHONE_CLASS = 67  # COCO "cell phone"
+PHONE_CONF = 0.5
+
+
+def phone_boxes(result):
+    """把一個 YOLO Result 轉成 [(x1, y1, x2, y2), ...]"""
+    return [tuple(map(int, box.xyxy[0])) for box in result.boxes]
+
+
+def detect_phones(yolo, frame, imgsz=None):
+    kwargs = {"imgsz": imgsz} if imgsz else {}
+    boxes = []
+    for result in yolo(frame, classes=[PHONE_CLASS], conf=PHONE_CONF, verbose=False, **kwargs):
+        boxes.extend(phone_boxes(result))
+    return boxes
+
+
+def create_face_mesh(static_image_mode=False):
+    """MediaPipe Face Mesh; video mode (default) tracks landmarks from frame to frame."""
+    return mp.solutions.face_mesh.FaceMesh(
+        static_image_mode=static_image_mode,
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+
+class FocusModels:
+    """無狀態的模型 (YOLO)，由 ModelPool 借給各個 session 使用
+
+    FaceMesh 不放在這裡：video mode 會記住上一幀的臉，每個 session 各有一個
+    (FocusAnalyzer.face_mesh)。yolo_weights=None 時不載入 YOLO (手機偵測交給 YoloBatcher)。
+    """
+    def __init__(self, yolo_weights=YOLO_WEIGHTS):
+        self.yolo = YOLO(yolo_weights) if yolo_weights else None
+
+
+class ModelPool:
+    """Process-wide pool of FocusModels, created lazily up to `size`.
+
+    A session borrows one set of models per frame. The models keep no state
+    between frames, so any free set will do.
+    """
+    def __init__(self, size=1, yolo_weights=YOLO_WEIGHTS):
+        self.size = max(1, size)
+        self.yolo_weights = yolo_weights
+        self._cond = threading.Condition()
+        self._idle = []
+        self._created = 0
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                self._cond.wait()
+        # 在鎖外載入模型，其他 session 不用等
+        try:
+            return FocusModels(self.yolo_weights)
+        except BaseException:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, models):
+        with self._cond:
+            self._idle.append(models)
+            self._cond.notify()
+
+    @contextmanager
+    def borrow(self):
+        models = self._acquire()
+        try:
+            yield models
+        finally:
+            self._release(models)
+
+    def warm(self):
+        """Load every model set now instead of on first use."""
+        with self._cond:
+            missing = self.size - self._created
+            self._created += missing
+        for _ in range(missing):
+            self._release(FocusModels(self.yolo_weights))
+
+
+_model_pool = None
+_model_pool_lock = threading.Lock()
+
+
+def get_model_pool(size=None, yolo_weights=YOLO_WEIGHTS):
+    """Return the process-wide ModelPool; arguments only apply on first call."""
+    global _model_pool
+    with _model_pool_lock:
+        if _model_pool is None:
+            _model_pool = ModelPool(size or 1, yolo_weights)
+        return _model_pool
+
+
 class FocusAnalyzer:
-    def __init__(self):
-        print("初始化分析大腦...")
-        
-        # 1. 載入 MediaPipe Face Mesh
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        
-        # 2. 載入 YOLO
-        self.yolo = YOLO('face_tracking/yolov8n.pt')
+    """Per-session state (calibration, gaze history, score, FaceMesh); YOLO comes from a ModelPool.
+
+    `phone_detector` (e.g. a YoloBatcher) replaces the pool's YOLO when given.
+    `phone_schedule` (PhoneDetectionScheduler kwargs) runs YOLO adaptively
+    instead of on every frame.
+    """
+    def __init__(self, pool=None, phone_detector=None, phone_schedule=None):
+        self.pool = pool or get_model_pool()
+        self.phone_detector = phone_detector
+        self.phone_scheduler = PhoneDetectionScheduler(**phone_schedule) if phone_schedule else None
+        self._face_box = None  # 上一幀的臉部範圍 (x1, y1, x2, y2)，給手機偵測的 ROI 用
+        self.face_mesh = None  # 第一幀才建立，開連線不用等
 
         # 3. 參數設定
         self.FRAME_W = 800 
@@ -68,36 +175,80 @@ class FocusAnalyzer:
         x2, y2 = p2.x * w, p2.y * h
         return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
 
-    def process_frame(self, frame):
+    def face_box(self, landmarks, w, h):
+        """臉部 landmarks 的外框 (像素座標)"""
+        xs = [p.x for p in landmarks]
+        ys = [p.y for p in landmarks]
+        return int(min(xs) * w), int(min(ys) * h), int(max(xs) * w), int(max(ys) * h)
+
+    def process_frame(self, frame, face_box=None):
+        """Analyse `frame` and draw the overlay on it. Returns (frame, score, status).
+
+        `face_box` (x1, y1, x2, y2): optional face position from the device's FaceDetector.
+        """
+        result = self.analyze(frame, face_box)
+        draw_overlay(frame, result)
+        return frame, result["score"], result["status"]
+
+    def analyze(self, frame, face_box=None):
+        """Analyse `frame` without drawing on it.
+
+        Returns {"score", "status", "phone", "phones": [[x1, y1, x2, y2], ...],
+        "calibrating", "face": [x1, y1, x2, y2] or None,
+        "landmarks": {name: [x, y]}} in pixel coordinates of `frame`.
+        """
         h, w, _ = frame.shape
         self.FRAME_H, self.FRAME_W = h, w
-        CENTER_X, CENTER_Y = w // 2, h // 2
 
+        if self.face_mesh is None:
+            self.face_mesh = create_face_mesh()
+        with self.pool.borrow() as models:
+            return self._analyze(models, frame, face_box)
+
+    def close(self):
+        if self.face_mesh is not None:
+            self.face_mesh.close()
+            self.face_mesh = None
 
+    def key_landmarks(self, landmarks, w, h):
+        idx = (self.IDX_NOSE, self.IDX_L_IRIS, self.IDX_L_EYE_L, self.IDX_L_EYE_R,
+               self.IDX_L_EYE_TOP, self.IDX_L_EYE_BOT)
+        return {name: [int(landmarks[i].x * w), int(landmarks[i].y * h)]
+                for name, i in zip(KEY_LANDMARKS, idx)}
+
+    def _analyze(self, models, frame, face_box=None):
+        h, w, _ = frame.shape
+        calibrating = False
+        # 優先用裝置給的臉框，否則用上一幀 landmarks 的外框
+        face_hint = face_box if face_box is not None else self._face_box
 
         # 2. YOLO 手機偵測
         phone_detected = False
-        yolo_results = self.yolo(frame, classes=[67], conf=0.5, verbose=False)
-        for result in yolo_results:
-            for box in result.boxes:
-                phone_detected = True
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                cv2.putText(frame, "PHONE!", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+        def detect(image, imgsz=None):
+            if self.phone_detector is not None:
+                return self.phone_detector.detect(image)
+            return detect_phones(models.yolo, image, imgsz)
+
+        with metrics.span("yolo"):
+            if self.phone_scheduler is not None:
+                boxes = self.phone_scheduler.update(frame, face_hint, detect)
+            else:
+                boxes = detect(frame)
+        phone_detected = len(boxes) > 0
 
         # 3. MediaPipe 臉部偵測
-        results = self.face_mesh.process(frame)
         face_found = False
         landmarks = None
 
+        # 整張圖丟給 video mode FaceMesh：找到臉之後它自己會裁切追蹤 (bench/bench_facemesh.py)
+        with metrics.span("facemesh"):
+            results = self.face_mesh.process(frame)
         if results.multi_face_landmarks:
             for face_landmarks in results.multi_face_landmarks:
                 landmarks = face_landmarks.landmark
                 face_found = True
-                
-                # 畫鼻子
-                # nose_pt = landmarks[self.IDX_NOSE]
-                # cv2.circle(frame, (int(nose_pt.x * w), int(nose_pt.y * h)), 5, (0, 255, 0), -1)
+
+        self._face_box = self.face_box(landmarks, w, h) if face_found else None
 
         # --- 邏輯判斷 ---
         if face_found and landmarks:
@@ -123,7 +274,7 @@ class FocusAnalyzer:
             # === 校正模式 ===
             if not self.is_calibrated:
                 self.status = f"Calibrating {len(self.calib_gaze)}/{self.CALIBRATION_FRAMES}"
-                cv2.putText(frame, "Keep EYES OPEN", (CENTER_X-150, CENTER_Y), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+                calibrating = True
                 
                 # 這裡不管眼睛大小，只要有偵測到就蒐集，這樣才能算出「你的」平均值
                 self.calib_gaze.append(current_rel_pos)
@@ -188,19 +339,15 @@ class FocusAnalyzer:
         # 分數限制
         self.focus_score = max(0, min(100, self.focus_score))
 
-        # 繪製介面
-        bar_width = int((self.focus_score / 100) * 300)
-        color = (0, 255, 0) if self.focus_score > 60 else (0, 0, 255)
-        cv2.rectangle(frame, (20, 40), (20 + bar_width, 70), color, -1)
-        cv2.rectangle(frame, (20, 40), (320, 70), (255, 255, 255), 2)
-        cv2.putText(frame, f"Score: {int(self.focus_score)}", (340, 65), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
-        cv2.putText(frame, f"Status: {self.status}", (20, 110), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-        
-        # 顯示個人化數據 (Debug)
-        # if self.is_calibrated:
-        #      cv2.putText(frame, f"Eye Base: {self.eye_open_base:.1f}", (20, 150), cv2.FONT_HERSHEY_PLAIN, 1, (200,200,200), 1)
-        print("pro")
-        return frame, int(self.focus_score), self.status
+        return {
+            "score": int(self.focus_score),
+            "status": self.status,
+            "phone": phone_detected,
+            "phones": [list(box) for box in boxes],
+            "calibrating": calibrating,
+            "face": list(self._face_box) if self._face_box else None,
+            "landmarks": self.key_landmarks(landmarks, w, h) if face_found else {},
+        }
 
 
 
@@ -0,0 +1,235 @@
+"""Executors that run FocusAnalyzer off the asyncio event loop.
+
+`ThreadInference` runs every session's analyzer on a shared thread pool
+(OpenCV / torch / MediaPipe release the GIL for the heavy parts); the YOLO
+weights come from one process-wide ModelPool, and phone detection can be
+micro-batched across sessions with a YoloBatcher. FaceMesh tracks the face
+from frame to frame, so every session has its own.
+`ProcessInference` pins each session to one worker process and hands frames
+over through a per-session shared-memory buffer instead of pickling them.
+Each worker process keeps its own single-entry ModelPool.
+
+Opening a session only creates the per-session state (calibration, gaze
+history, score), so a reconnect does not reload YOLO; the session's FaceMesh
+is created on its first frame.
+
+`session.analyze(frame, face_box, draw)` returns (frame or None, result);
+with draw=False no overlay is drawn and no frame is handed back.
+
+Timing spans recorded inside a worker process are drained after each frame
+and merged into the server's `metrics`, so /metrics looks the same for both
+executors.
+
+In both cases a session only ever has one frame in flight, so frames of one
+connection are analysed strictly in order while different connections run
+in parallel.
+"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from batching import YoloBatcher
+from focus_analyzer import YOLO_WEIGHTS, FocusAnalyzer, get_model_pool
+from metrics import metrics
+from overlay import draw_overlay
+
+
+def _analyze(analyzer, frame, face_box, draw):
+    result = analyzer.analyze(frame, face_box)
+    if draw:
+        with metrics.span("draw"):
+            draw_overlay(frame, result)
+    return result
+
+
+class ThreadSession:
+    def __init__(self, engine, analyzer):
+        self.engine = engine
+        self.analyzer = analyzer
+        if engine.batcher is not None:
+            engine.batcher.register()
+
+    def input_buffer(self, shape, dtype=np.uint8):
+        return np.empty(shape, dtype)
+
+    async def analyze(self, frame, face_box=None, draw=True):
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            self.engine.executor, _analyze, self.analyzer, frame, face_box, draw)
+        return (frame if draw else None), result
+
+    async def close(self):
+        if self.analyzer is not None and self.engine.batcher is not None:
+            self.engine.batcher.unregister()
+        # a cancelled analyze may still be running on the executor: let its FaceMesh go with the analyzer
+        self.analyzer = None
+
+
+class ThreadInference:
+    def __init__(self, workers=None, pool_size=None, batch_size=1, batch_wait_ms=4.0,
+                 analyzer_options=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.analyzer_options = analyzer_options or {}
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analyzer")
+        self.batcher = None
+        yolo_weights = YOLO_WEIGHTS
+        if batch_size > 1:
+            # phone detection of all sessions goes through one batched YOLO
+            self.batcher = YoloBatcher(max_batch=batch_size, max_wait_ms=batch_wait_ms,
+                                       concurrency=self.workers)
+            yolo_weights = None
+        # more YOLO instances than threads would never be borrowed at the same time
+        self.pool = get_model_pool(min(pool_size or self.workers, self.workers), yolo_weights)
+
+    async def open_session(self):
+        analyzer = FocusAnalyzer(self.pool, phone_detector=self.batcher, **self.analyzer_options)
+        return ThreadSession(self, analyzer)
+
+    async def warm(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.pool.warm)
+
+    def shutdown(self):
+        # running analyzes may still be waiting on the batcher: stop the threads first
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.batcher is not None:
+            self.batcher.close()
+
+
+# --- process pool -----------------------------------------------------------
+# Worker-process side. Each worker keeps the analyzers and shared-memory
+# attachments of the sessions pinned to it.
+_worker_analyzers = {}
+_worker_buffers = {}
+
+
+def _worker_open(session_id, analyzer_options):
+    _worker_analyzers[session_id] = FocusAnalyzer(**analyzer_options)
+
+
+def _worker_warm():
+    get_model_pool().warm()
+
+
+def _worker_process(session_id, shm_name, shape, dtype, face_box, draw):
+    shm = _worker_buffers.get(session_id)
+    if shm is None or shm.name != shm_name:
+        if shm is not None:
+            shm.close()
+        shm = _worker_buffers[session_id] = shared_memory.SharedMemory(name=shm_name)
+    frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    # the overlay is drawn on the frame in place, the parent reads it back from shm
+    result = _analyze(_worker_analyzers[session_id], frame, face_box, draw)
+    return result, metrics.drain()
+
+
+def _worker_close(session_id):
+    analyzer = _worker_analyzers.pop(session_id, None)
+    if analyzer is not None:
+        analyzer.close()
+    shm = _worker_buffers.pop(session_id, None)
+    if shm is not None:
+        shm.close()
+
+
+class ProcessSession:
+    def __init__(self, engine, session_id, worker):
+        self.engine = engine
+        self.session_id = session_id
+        self.worker = worker
+        self._shm = None
+        self._frame = None
+
+    def input_buffer(self, shape, dtype=np.uint8):
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        if self._shm is None or self._shm.size < nbytes:
+            self._release()
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._frame = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf)
+        return self._frame
+
+    async def analyze(self, frame, face_box=None, draw=True):
+        if frame is not self._frame:
+            np.copyto(self.input_buffer(frame.shape, frame.dtype), frame)
+        loop = asyncio.get_running_loop()
+        result, spans = await loop.run_in_executor(
+            self.worker, _worker_process,
+            self.session_id, self._shm.name, self._frame.shape, self._frame.dtype.str, face_box, draw,
+        )
+        metrics.merge(spans)
+        return (self._frame if draw else None), result
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.worker, _worker_close, self.session_id)
+        finally:
+            self.engine._release_worker(self.worker)
+            self.engine._sessions.discard(self)
+            self._release()
+
+    def _release(self):
+        self._frame = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class ProcessInference:
+    def __init__(self, workers=None, analyzer_options=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.analyzer_options = analyzer_options or {}
+        # one single-process pool per worker so a session can be pinned to it;
+        # spawn, because forking a process that runs an event loop shares its epoll fd
+        ctx = multiprocessing.get_context("spawn")
+        self._pools = [ProcessPoolExecutor(max_workers=1, mp_context=ctx) for _ in range(self.workers)]
+        self._load = {pool: 0 for pool in self._pools}
+        self._ids = itertools.count(1)
+        self._sessions = set()  # open sessions, their shared memory is unlinked on shutdown
+
+    async def open_session(self):
+        worker = min(self._pools, key=self._load.get)
+        self._load[worker] += 1
+        session_id = next(self._ids)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(worker, _worker_open, session_id, self.analyzer_options)
+        except BaseException:
+            self._release_worker(worker)
+            raise
+        session = ProcessSession(self, session_id, worker)
+        self._sessions.add(session)
+        return session
+
+    async def warm(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, _worker_warm) for pool in self._pools))
+
+    def _release_worker(self, worker):
+        self._load[worker] -= 1
+
+    def shutdown(self):
+        # wait for the workers to exit, then unlink the buffers of sessions that never closed
+        for pool in self._pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for session in list(self._sessions):
+            session._release()
+        self._sessions.clear()
+
+
+def create_engine(kind, workers=None, pool_size=None, batch_size=1, batch_wait_ms=4.0,
+                  analyzer_options=None):
+    """`analyzer_options` are extra FocusAnalyzer kwargs applied to every session."""
+    if kind == "thread":
+        return ThreadInference(workers, pool_size, batch_size, batch_wait_ms, analyzer_options)
+    if kind == "process":
+        # a worker process analyses one frame at a time: one model set, nothing to batch
+        return ProcessInference(workers, analyzer_options)
+    raise ValueError(f"unknown executor {kind!r}")
@@ -0,0 +1,180 @@
+"""Per-stage timing spans aggregated into fixed-bucket histograms.
+
+    with metrics.span("yolo"):
+        boxes = detect(frame)
+
+Every stage becomes one series of the `focusmate_stage_seconds` histogram,
+rendered in the Prometheus text format by `render()` (served as /metrics by
+app.py on the device and by server.py on the backend). Buckets are fixed, so
+recording is a bisect and three additions under a lock, about 1 µs per span
+(bench/bench_metrics.py); a frame has about ten spans and takes tens of
+milliseconds, so the cost stays far below 1%.
+
+Switch: FOCUSMATE_METRICS=0 in the environment, or `metrics.enabled = False`.
+Disabled spans return a shared no-op object and do not read the clock.
+
+Used from both sides of the link: `from metrics import metrics` in backend/
+(script-style imports), `from backend.metrics import metrics` on the device.
+"""
+import bisect
+import os
+import threading
+import time
+
+# 秒；涵蓋 JPEG encode (~ms) 到 YOLO 在 Pi 上 (~s)
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最後一格是 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            snap = (list(self.counts), self.sum, self.count)
+            if reset:
+                self.counts = [0] * len(self.counts)
+                self.sum = 0.0
+                self.count = 0
+        return snap
+
+    def merge(self, snap):
+        counts, total, count = snap
+        with self._lock:
+            for i, n in enumerate(counts):
+                self.counts[i] += n
+            self.sum += total
+            self.count += count
+
+
+class _Span:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Stage histograms plus a few counters and gauges, in one Prometheus namespace."""
+
+    def __init__(self, namespace="focusmate", buckets=BUCKETS, enabled=True):
+        self.namespace = namespace
+        self.buckets = buckets
+        self.enabled = enabled
+        self._stages = {}
+        self._counters = {}     # name -> [help, value]
+        self._gauges = {}       # name -> (help, fn)
+        self._lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, Histogram(self.buckets))
+        return histogram
+
+    def span(self, stage):
+        """Context manager timing one pass through `stage`."""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self.histogram(stage))
+
+    def observe(self, stage, seconds):
+        """Record a duration measured elsewhere (e.g. a round trip across threads)."""
+        if self.enabled:
+            self.histogram(stage).observe(seconds)
+
+    def inc(self, name, n=1, help=""):
+        if not self.enabled:
+            return
+        with self._lock:
+            counter = self._counters.setdefault(name, [help, 0])
+            counter[1] += n
+
+    def gauge(self, name, fn, help=""):
+        """Register `fn()` to be read at every render."""
+        self._gauges[name] = (help, fn)
+
+    def drain(self):
+        """Take and reset the stage histograms, to ship them to another process."""
+        with self._lock:
+            stages = list(self._stages.items())
+        return {stage: h.snapshot(reset=True) for stage, h in stages if h.count}
+
+    def merge(self, drained):
+        for stage, snap in drained.items():
+            self.histogram(stage).merge(snap)
+
+    def render(self):
+        ns = self.namespace
+        lines = [f"# HELP {ns}_metrics_enabled 1 if timing spans are being recorded.",
+                 f"# TYPE {ns}_metrics_enabled gauge",
+                 f"{ns}_metrics_enabled {int(self.enabled)}"]
+        name = f"{ns}_stage_seconds"
+        lines += [f"# HELP {name} Time spent in each pipeline stage.",
+                  f"# TYPE {name} histogram"]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            counters = sorted((k, list(v)) for k, v in self._counters.items())
+        for stage, histogram in stages:
+            counts, total, count = histogram.snapshot()
+            label = f'stage="{_escape(stage)}"'
+            cumulative = 0
+            for le, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{label},le="{le:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{label}}} {total:.6f}")
+            lines.append(f"{name}_count{{{label}}} {count}")
+        for counter, (help, value) in counters:
+            lines += [f"# HELP {ns}_{counter} {help}", f"# TYPE {ns}_{counter} counter",
+                      f"{ns}_{counter} {value}"]
+        for gauge, (help, fn) in sorted(self._gauges.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            lines += [f"# HELP {ns}_{gauge} {help}", f"# TYPE {ns}_{gauge} gauge",
+                      f"{ns}_{gauge} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+metrics = Metrics(enabled=os.environ.get("FOCUSMATE_METRICS", "1") != "0")
@@ -0,0 +1,31 @@
+"""Drawing of the focus overlay (score bar, status, phone boxes).
+
+Kept free of model imports so the device can render the same overlay from a
+metadata-only result (see FocusAnalyzer.analyze) when a photo is requested.
+"""
+import cv2
+
+# FocusAnalyzer.analyze() result["landmarks"] keys
+KEY_LANDMARKS = ("nose", "l_iris", "l_eye_l", "l_eye_r", "l_eye_top", "l_eye_bot")
+
+
+def draw_overlay(frame, result):
+    """Draw an analysis result onto `frame` in place and return it."""
+    h, w = frame.shape[:2]
+    score = result["score"]
+
+    for x1, y1, x2, y2 in result.get("phones", ()):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
+        cv2.putText(frame, "PHONE!", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+
+    if result.get("calibrating"):
+        cv2.putText(frame, "Keep EYES OPEN", (w // 2 - 150, h // 2), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+
+    # 繪製介面
+    bar_width = int((score / 100) * 300)
+    color = (0, 255, 0) if score > 60 else (0, 0, 255)
+    cv2.rectangle(frame, (20, 40), (20 + bar_width, 70), color, -1)
+    cv2.rectangle(frame, (20, 40), (320, 70), (255, 255, 255), 2)
+    cv2.putText(frame, f"Score: {int(score)}", (340, 65), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+    cv2.putText(frame, f"Status: {result['status']}", (20, 110), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+    return frame
@@ -0,0 +1,117 @@
+"""Adaptive cadence for YOLO phone detection.
+
+A phone showing up or going away is slow next to the frame rate, so a
+session does not need a full-frame YOLO pass on every frame. The scheduler
+runs detection when
+
+  * `every_n` frames have passed since the last run,
+  * a cheap motion score (mean abs difference of a tiny grayscale thumbnail
+    of the watched region) crosses `motion_threshold`, or
+  * the last verdict is older than `hold_s`,
+
+and otherwise returns the last verdict. A positive verdict is also held for
+`hold_s` after the phone was last seen, so one missed detection does not flip
+the status back and forth. Worst-case latency for "NO PHONE!" is therefore
+`every_n` frames; a sudden movement in the region triggers it right away.
+
+With `roi=True` and a known face box, detection only looks at the desk area
+below and around the face, at the smaller `roi_imgsz` inference size. The
+region is held still while the face box jitters (edges within
+`REGION_SLACK` px); when it does move, or switches between desk area and
+full frame, the motion reference restarts instead of comparing two
+different regions.
+"""
+import time
+
+import cv2
+import numpy as np
+
+
+class PhoneDetectionScheduler:
+    MOTION_SIZE = (64, 48)
+    REGION_SLACK = 24   # 臉框抖動造成的區域變化小於這個 (px) 就沿用原本的區域
+
+    def __init__(self, every_n=5, hold_s=1.0, motion_threshold=8.0, roi=True, roi_imgsz=320):
+        self.every_n = max(1, every_n)
+        self.hold_s = hold_s
+        self.motion_threshold = motion_threshold
+        self.roi = roi
+        self.roi_imgsz = roi_imgsz
+
+        self._frames_since_run = None
+        self._last_run_at = 0.0
+        self._last_seen_at = 0.0
+        self._boxes = []
+        self._prev_thumb = None
+        self._region = None     # 目前看的區域，None 是整張圖
+
+        self.runs = 0
+        self.frames = 0
+
+    def region(self, frame_shape, face_box):
+        """Desk area below the face: (x1, y1, x2, y2), or None for the full frame."""
+        if not self.roi or face_box is None:
+            return None
+        h, w = frame_shape[:2]
+        fx1, fy1, fx2, fy2 = face_box
+        fw = fx2 - fx1
+        x1 = max(0, int(fx1 - 1.5 * fw))
+        x2 = min(w, int(fx2 + 1.5 * fw))
+        y1 = max(0, int(fy1))
+        if x2 - x1 < 32 or h - y1 < 32:
+            return None
+        return x1, y1, x2, h
+
+    def _stable_region(self, region):
+        prev = self._region
+        if region is not None and prev is not None and \
+                max(abs(a - b) for a, b in zip(region, prev)) <= self.REGION_SLACK:
+            return prev
+        if region != prev:
+            # 換了區域：縮圖不能跟別的區域比，重新開始
+            self._prev_thumb = None
+        self._region = region
+        return region
+
+    def _motion(self, image):
+        gray = cv2.cvtColor(cv2.resize(image, self.MOTION_SIZE, interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_BGR2GRAY)
+        prev, self._prev_thumb = self._prev_thumb, gray
+        if prev is None:
+            return 0.0   # 沒有參考畫面；靠 every_n / hold_s
+        return float(np.mean(cv2.absdiff(gray, prev)))
+
+    def update(self, frame, face_box, detect):
+        """Return phone boxes for `frame`; `detect(image, imgsz)` is called only when needed."""
+        self.frames += 1
+        now = time.monotonic()
+        region = self._stable_region(self.region(frame.shape, face_box))
+        view = frame if region is None else frame[region[1]:region[3], region[0]:region[2]]
+        motion = self._motion(view)
+
+        due = (
+            self._frames_since_run is None
+            or self._frames_since_run + 1 >= self.every_n
+            or motion > self.motion_threshold
+            or now - self._last_run_at > self.hold_s
+        )
+        if not due:
+            self._frames_since_run += 1
+            return self._boxes
+
+        self.runs += 1
+        self._frames_since_run = 0
+        self._last_run_at = now
+        if region is None:
+            boxes = detect(frame, None)
+        else:
+            ox, oy = region[0], region[1]
+            boxes = [(x1 + ox, y1 + oy, x2 + ox, y2 + oy)
+                     for x1, y1, x2, y2 in detect(view, self.roi_imgsz)]
+
+        if boxes:
+            self._boxes = boxes
+            self._last_seen_at = now
+        elif now - self._last_seen_at > self.hold_s:
+            self._boxes = []
+        return self._boxes
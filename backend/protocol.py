@@ -0,0 +1,122 @@
+"""Binary frame protocol shared by the tracker client and the backend server.
+
+Every binary WebSocket message is laid out as
+
+    | header (HEADER.size bytes) | meta (meta_len bytes, UTF-8 JSON) | payload |
+
+The header is fixed size and big-endian:
+
+    magic     2s   b"FM"
+    version   B    PROTOCOL_VERSION
+    kind      B    KIND_FRAME / KIND_FRAME_CROP (device -> server),
+                   KIND_RESULT (server -> device)
+    seq       I    frame sequence number, echoed back in the result
+    timestamp d    capture time (time.time()) of the frame
+    width     H    frame width in pixels
+    height    H    frame height in pixels
+    codec     B    CODEC_JPEG / CODEC_NONE
+    flags     B    FLAG_* bits (request options), 0 by default
+    meta_len  H    length of the optional JSON meta block
+
+The payload is the raw encoded image (no base64). Decoding never copies the
+payload: it is returned as a memoryview into the received message.
+
+KIND_FRAME_CROP is the edge-crop upload: the payload is a full-resolution JPEG
+of the face region followed by a downscaled JPEG of the whole frame. The meta
+block carries {"crop": [x1, y1, x2, y2], "crop_len": <bytes of the crop JPEG>};
+width/height in the header are the full frame size. Use split_crop_payload().
+
+A frame with FLAG_META_ONLY asks for a metadata-only result: CODEC_NONE, empty
+payload, and the analysis result (score, status, phone boxes, key landmarks)
+in the meta block. The device draws the overlay itself when it needs a photo.
+"""
+import json
+import struct
+from collections import namedtuple
+
+MAGIC = b"FM"
+PROTOCOL_VERSION = 1
+
+KIND_FRAME = 1
+KIND_RESULT = 2
+KIND_FRAME_CROP = 3
+
+CODEC_NONE = 0
+CODEC_JPEG = 1
+
+FLAG_META_ONLY = 0x01
+
+HEADER = struct.Struct("!2sBBIdHHBBH")
+
+FrameHeader = namedtuple(
+    "FrameHeader",
+    ["version", "kind", "seq", "timestamp", "width", "height", "codec", "flags"],
+)
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def encode_message(kind, seq, timestamp, width, height, payload=b"",
+                   codec=CODEC_JPEG, meta=None, flags=0):
+    """Build one binary message.
+
+    `payload` may be any buffer (bytes, numpy array...) or a list of buffers,
+    which are written back to back.
+    """
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode() if meta else b""
+    parts = payload if isinstance(payload, (list, tuple)) else [payload]
+    parts = [memoryview(part).cast("B") for part in parts]
+    header_end = HEADER.size + len(meta_bytes)
+
+    buf = bytearray(header_end + sum(part.nbytes for part in parts))
+    HEADER.pack_into(buf, 0, MAGIC, PROTOCOL_VERSION, kind, seq & 0xFFFFFFFF,
+                     timestamp, width, height, codec, flags, len(meta_bytes))
+    buf[HEADER.size:header_end] = meta_bytes
+    offset = header_end
+    for part in parts:
+        buf[offset:offset + part.nbytes] = part
+        offset += part.nbytes
+    return buf
+
+
+def decode_message(data):
+    """Parse a binary message. Returns (FrameHeader, meta dict or None, payload memoryview)."""
+    view = memoryview(data)
+    if view.nbytes < HEADER.size:
+        raise ProtocolError(f"message too short ({view.nbytes} bytes)")
+
+    magic, version, kind, seq, timestamp, width, height, codec, flags, meta_len = \
+        HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ProtocolError(f"bad magic {magic!r}")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"unsupported protocol version {version}")
+
+    header_end = HEADER.size + meta_len
+    if view.nbytes < header_end:
+        raise ProtocolError("truncated meta block")
+    meta = json.loads(view[HEADER.size:header_end].tobytes()) if meta_len else None
+
+    header = FrameHeader(version, kind, seq, timestamp, width, height, codec, flags)
+    return header, meta, view[header_end:]
+
+
+def encode_crop_message(seq, timestamp, width, height, crop_jpeg, small_jpeg, crop_box, flags=0):
+    crop_jpeg = memoryview(crop_jpeg).cast("B")
+    meta = {"crop": [int(v) for v in crop_box], "crop_len": crop_jpeg.nbytes}
+    return encode_message(KIND_FRAME_CROP, seq, timestamp, width, height,
+                          [crop_jpeg, small_jpeg], codec=CODEC_JPEG, meta=meta, flags=flags)
+
+
+def split_crop_payload(meta, payload):
+    """Returns (crop box, crop JPEG view, downscaled full-frame JPEG view)."""
+    crop_len = meta["crop_len"]
+    if crop_len > payload.nbytes:
+        raise ProtocolError("crop length exceeds payload")
+    return tuple(meta["crop"]), payload[:crop_len], payload[crop_len:]
+
+
+def is_binary_message(msg):
+    return isinstance(msg, (bytes, bytearray, memoryview))
@@ -1,44 +1,317 @@
+import argparse
 import asyncio
 import websockets
 import json
 import base64
+import os
+import signal
+import time
 import cv2
 import numpy as np
-from focus_analyzer import FocusAnalyzer  # 你的 FocusAnalyzer
+from inference import create_engine
+from metrics import CONTENT_TYPE, metrics
+from protocol import (
+    KIND_FRAME, KIND_FRAME_CROP, KIND_RESULT, CODEC_JPEG, CODEC_NONE, FLAG_META_ONLY,
+    ProtocolError, decode_message, encode_message, is_binary_message, split_crop_payload,
+)
 
 
+def _imdecode(buf):
+    image = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ProtocolError("failed to decode JPEG payload")
+    return image
 
-async def handler(ws):   # 必須有兩個參數！
-    analyzer = FocusAnalyzer()
-    async for msg in ws:
-        try:
-            
-            data = json.loads(msg)
 
-            frame_b64 = data["frame"]
-            frame_bytes = base64.b64decode(frame_b64)
-            frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
-            frame_flip = cv2.flip(frame, 0)
-            processed_frame, score, status = analyzer.process_frame(frame_flip)
+def compose_crop_frame(header, meta, payload):
+    """Rebuild a full-size frame from an edge-crop message.
+
+    The downscaled frame is resized back to full size and the full-resolution
+    face crop is pasted over it, so eyes/iris keep their full resolution while
+    phone detection sees the (upscaled) whole scene.
+    """
+    (x1, y1, x2, y2), crop_jpeg, small_jpeg = split_crop_payload(meta, payload)
+    crop = _imdecode(crop_jpeg)
+    frame = cv2.resize(_imdecode(small_jpeg), (header.width, header.height),
+                       interpolation=cv2.INTER_LINEAR)
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(header.width, x1 + crop.shape[1]), min(header.height, y1 + crop.shape[0])
+    frame[y1:y2, x1:x2] = crop[:y2 - y1, :x2 - x1]
+    return frame, (x1, y1, x2, y2)
+
+
+def decode_request(msg):
+    """Decode one incoming message.
+
+    Returns (frame, header, face_box); header is None for legacy JSON and
+    face_box is only set for edge-crop messages (raw, unflipped coordinates).
+    """
+    with metrics.span("decode"):
+        return _decode_request(msg)
+
+
+def _decode_request(msg):
+    if is_binary_message(msg):
+        header, meta, payload = decode_message(msg)
+        if header.codec != CODEC_JPEG:
+            raise ProtocolError(f"unexpected codec {header.codec}")
+        if header.kind == KIND_FRAME:
+            return _imdecode(payload), header, None
+        if header.kind == KIND_FRAME_CROP:
+            frame, face_box = compose_crop_frame(header, meta, payload)
+            return frame, header, face_box
+        raise ProtocolError(f"unexpected message kind {header.kind}")
+
+    # 舊版 JSON + base64 格式
+    data = json.loads(msg)
+    frame_bytes = base64.b64decode(data["frame"])
+    return _imdecode(frame_bytes), None, None
+
+
+def wants_meta_only(header):
+    return header is not None and bool(header.flags & FLAG_META_ONLY)
+
+
+def encode_reply(processed_frame, result, header, frame_size):
+    """Encode the reply in the same format the request came in.
+
+    `processed_frame` is None for metadata-only requests: nothing is drawn or
+    JPEG-encoded, the result goes back in the meta block.
+    """
+    with metrics.span("encode"):
+        return _encode_reply(processed_frame, result, header, frame_size)
+
+
+def _encode_reply(processed_frame, result, header, frame_size):
+    w, h = frame_size
+    if processed_frame is None:
+        return encode_message(KIND_RESULT, header.seq, header.timestamp, w, h,
+                              codec=CODEC_NONE, meta=result)
+
+    _, jpeg = cv2.imencode(".jpg", processed_frame)
+
+    if header is not None:
+        return encode_message(
+            KIND_RESULT, header.seq, header.timestamp, w, h, jpeg,
+            codec=CODEC_JPEG, meta=result,
+        )
+
+    return json.dumps({
+        "frame": base64.b64encode(jpeg).decode(),
+        "score": result["score"],
+        "status": result["status"]
+    })
+
 
-            _, jpeg = cv2.imencode(".jpg", processed_frame)
-            jpeg_b64 = base64.b64encode(jpeg.tobytes()).decode()
+class ServerStats:
+    def __init__(self):
+        self.connections = 0
+        self.frames = 0
+        self.dropped = 0
+        self.lag_sum = 0.0
+        self.lag_max = 0.0
+        self.lag_samples = 0
 
-            resp = json.dumps({
-                "frame": jpeg_b64,
-                "score": score,
-                "status": status
-            })
+    def record_lag(self, lag):
+        self.lag_sum += lag
+        self.lag_samples += 1
+        self.lag_max = max(self.lag_max, lag)
 
-            await ws.send(resp)
+    def report(self, elapsed):
+        lag_avg = self.lag_sum / self.lag_samples if self.lag_samples else 0.0
+        line = (f"[stats] conns={self.connections} frames={self.frames} "
+                f"({self.frames / elapsed:.1f}/s) dropped={self.dropped} "
+                f"loop_lag avg={lag_avg * 1000:.1f}ms max={self.lag_max * 1000:.1f}ms")
+        self.frames = self.dropped = self.lag_samples = 0
+        self.lag_sum = self.lag_max = 0.0
+        return line
 
+
+engine = None
+stats = ServerStats()
+QUEUE_SIZE = 2  # 每個連線最多排隊的 frame 數，滿了就丟掉最舊的
+
+
+async def process_frames(ws, session, queue):
+    """Analyse one connection's frames strictly in order, off the event loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        msg, queued_at = item
+        start = time.perf_counter()
+        metrics.observe("queue_wait", start - queued_at)
+        try:
+            frame, header, face_box = await loop.run_in_executor(None, decode_request, msg)
+
+            frame_flip = cv2.flip(frame, 0, dst=session.input_buffer(frame.shape, frame.dtype))
+            if face_box is not None:
+                # 上下翻轉後臉框的 y 也要跟著翻
+                fh = frame.shape[0]
+                face_box = (face_box[0], fh - face_box[3], face_box[2], fh - face_box[1])
+            with metrics.span("analyze"):
+                processed_frame, result = await session.analyze(
+                    frame_flip, face_box, draw=not wants_meta_only(header))
+            # 裝置用 round trip 減掉這個，估計網路花的時間
+            result["server_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+            reply = await loop.run_in_executor(
+                None, encode_reply, processed_frame, result, header,
+                (frame.shape[1], frame.shape[0]))
+            stats.frames += 1
+            metrics.inc("frames_total", help="Frames analysed.")
+            with metrics.span("send"):
+                await ws.send(reply)
+            metrics.observe("frame", time.perf_counter() - start)
+
+        except websockets.ConnectionClosed:
+            return
         except Exception as e:
             print("Server error:", e)
 
-async def main():
-    print("Server started on port 8765")
-    async with websockets.serve(handler, "0.0.0.0", 8765):
-        await asyncio.Future()
+
+async def handler(ws):   # 必須有兩個參數！
+    session = await engine.open_session()
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    worker = asyncio.create_task(process_frames(ws, session, queue))
+    stats.connections += 1
+    try:
+        async for msg in ws:
+            if queue.full():
+                queue.get_nowait()  # 丟掉最舊的 frame，保持即時
+                stats.dropped += 1
+                metrics.inc("dropped_total", help="Frames dropped because a connection's queue was full.")
+            queue.put_nowait((msg, time.perf_counter()))
+    finally:
+        stats.connections -= 1
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+        await session.close()
+
+
+async def monitor_loop(stats_interval, tick=0.1):
+    """Measure event-loop lag (how late a sleep wakes up) and print a stats line."""
+    loop = asyncio.get_running_loop()
+    last_report = loop.time()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(tick)
+        now = loop.time()
+        stats.record_lag(max(0.0, now - start - tick))
+        if stats_interval and now - last_report >= stats_interval:
+            print(stats.report(now - last_report))
+            last_report = now
+
+
+async def serve_metrics(reader, writer):
+    """Minimal HTTP responder: GET /metrics in the Prometheus text format."""
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5.0)
+        # 讀掉剩下的 header
+        while (await asyncio.wait_for(reader.readline(), 5.0)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+            status, content_type, body = "200 OK", CONTENT_TYPE, metrics.render().encode()
+        else:
+            status, content_type, body = "404 Not Found", "text/plain", b"not found\n"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def analyzer_options(args):
+    options = {}
+    if args.phone_every > 1:
+        options["phone_schedule"] = {
+            "every_n": args.phone_every,
+            "hold_s": args.phone_hold_s,
+            "motion_threshold": args.phone_motion,
+            "roi": args.phone_roi,
+            "roi_imgsz": args.phone_roi_imgsz,
+        }
+    return options
+
+
+async def main(args):
+    global engine, QUEUE_SIZE
+    QUEUE_SIZE = args.queue_size
+    if not args.metrics:
+        metrics.enabled = False
+        os.environ["FOCUSMATE_METRICS"] = "0"  # process executor 的 worker 也關掉
+    metrics.gauge("connections", lambda: stats.connections, help="Open WebSocket connections.")
+    engine = create_engine(args.executor, args.workers, args.model_pool_size,
+                           args.batch_size, args.batch_wait_ms, analyzer_options(args))
+    print(f"Server started on port {args.port} ({args.executor} executor, {engine.workers} workers)")
+    monitor = asyncio.create_task(monitor_loop(args.stats_interval))
+    if args.warm:
+        asyncio.create_task(engine.warm())
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = await asyncio.start_server(serve_metrics, args.host, args.metrics_port)
+        print(f"Metrics on http://{args.host}:{args.metrics_port}/metrics")
+    # SIGTERM (systemd, kill) 跟 Ctrl+C 一樣正常結束，engine 才會收掉 worker 跟 shared memory
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+        except NotImplementedError:
+            pass    # Windows：只有 Ctrl+C (KeyboardInterrupt)
+    try:
+        async with websockets.serve(handler, args.host, args.port):
+            await stop
+        print("Server stopping")
+    finally:
+        monitor.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        engine.shutdown()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--executor', choices=["thread", "process"], default="thread",
+                        help='Where FocusAnalyzer runs: a thread pool, or worker processes '
+                             'fed through shared memory.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Executor size (default: number of CPUs).')
+    parser.add_argument('--model-pool-size', type=int, default=None,
+                        help='YOLO instances shared by all sessions (thread executor; '
+                             'default: one per worker).')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Max frames per batched YOLO call across sessions (thread executor; '
+                             '1 disables batching).')
+    parser.add_argument('--batch-wait-ms', type=float, default=4.0,
+                        help='Max time the first frame of a batch waits for more frames.')
+    parser.add_argument('--phone-every', type=int, default=1,
+                        help='Run phone detection at least every N frames (1 = every frame, '
+                             'no scheduling).')
+    parser.add_argument('--phone-hold-s', type=float, default=1.0,
+                        help='Seconds a phone verdict is held between detections.')
+    parser.add_argument('--phone-motion', type=float, default=8.0,
+                        help='Motion score (mean abs diff, 0-255) that triggers an early detection.')
+    parser.add_argument('--phone-roi', action=argparse.BooleanOptionalAction, default=True,
+                        help='Only look at the desk area below the face when a face is known.')
+    parser.add_argument('--phone-roi-imgsz', type=int, default=320,
+                        help='YOLO inference size used for the ROI.')
+    parser.add_argument('--warm', action='store_true',
+                        help='Load all models at startup instead of on first use.')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE,
+                        help='Frames buffered per connection before the oldest is dropped.')
+    parser.add_argument('--stats-interval', type=float, default=10.0,
+                        help='Seconds between stats lines, 0 to disable.')
+    parser.add_argument('--metrics', action=argparse.BooleanOptionalAction, default=metrics.enabled,
+                        help='Record per-stage timing spans (also FOCUSMATE_METRICS=0).')
+    parser.add_argument('--metrics-port', type=int, default=8766,
+                        help='Port of the Prometheus /metrics endpoint, 0 to disable.')
+    asyncio.run(main(parser.parse_args()))
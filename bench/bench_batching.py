@@ -0,0 +1,95 @@
+"""Compare per-session YOLO calls with cross-session micro-batching.
+
+Run from the repo root (needs ultralytics and face_tracking/yolov8n.pt):
+
+    python3 -m bench.bench_batching --devices 1 4 16 --frames 50
+
+Every simulated device is a thread that sends frames back to back, the way a
+ThreadInference session does. "unbatched" gives each device a batch-1 call on
+one of `--workers` YOLO instances; "batched" routes all devices through one
+YoloBatcher. Reports aggregate frames/s and per-frame latency percentiles.
+"""
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend'))
+
+from ultralytics import YOLO  # noqa: E402
+
+from batching import YoloBatcher  # noqa: E402
+from focus_analyzer import YOLO_WEIGHTS, detect_phones  # noqa: E402
+from bench.bench_protocol import make_frame  # noqa: E402
+
+
+def run_devices(devices, frames, detect):
+    latencies = []
+    lock = threading.Lock()
+    frame = make_frame(800, 600)
+
+    def device():
+        local = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            detect(frame)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=device) for _ in range(devices)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return devices * frames / elapsed, np.percentile(ms, 50), np.percentile(ms, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--frames', type=int, default=50, help='Frames per device.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='YOLO instances for the unbatched baseline.')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--batch-wait-ms', type=float, default=4.0)
+    args = parser.parse_args()
+
+    models = queue.Queue()
+    for _ in range(args.workers):
+        models.put(YOLO(YOLO_WEIGHTS))
+
+    def unbatched(frame):
+        yolo = models.get()
+        try:
+            return detect_phones(yolo, frame)
+        finally:
+            models.put(yolo)
+
+    warmup = make_frame(800, 600)
+    unbatched(warmup)
+
+    print(f"{'devices':>8}{'mode':>11}{'frames/s':>11}{'p50 ms':>9}{'p95 ms':>9}")
+    for devices in args.devices:
+        fps, p50, p95 = run_devices(devices, args.frames, unbatched)
+        print(f"{devices:>8}{'unbatched':>11}{fps:>11.1f}{p50:>9.1f}{p95:>9.1f}")
+
+        batcher = YoloBatcher(max_batch=args.batch_size, max_wait_ms=args.batch_wait_ms)
+        for _ in range(devices):
+            batcher.register()
+        batcher.detect(warmup)
+        fps, p50, p95 = run_devices(devices, args.frames, batcher.detect)
+        print(f"{devices:>8}{'batched':>11}{fps:>11.1f}{p50:>9.1f}{p95:>9.1f}"
+              f"   (avg batch {batcher.frames / max(1, batcher.batches):.1f})")
+        batcher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Closed-loop comparison of face smoothing: 5-frame window vs. Kalman predictor.
+
+    python3 -m bench.bench_face_filter --seconds 60 --latency-ms 60
+
+Simulates the pan/tilt head instead of replaying a recording, because the
+error that matters (how far the face is from the image centre) depends on
+where the servos pointed the camera. A face moves in world angles (slow
+sway, sudden leans), the camera sees it through the current servo angles,
+and the detector reports its centre with pixel noise, random misses and
+occasional longer gaps. Each frame reaches FaceTracker.follow() after the
+capture-to-actuation latency, and the commands go to mock servos on a
+simulated clock.
+
+Reports the RMS / p95 distance of the true face centre from the set point
+over every camera frame, and the number of servo commands sent.
+"""
+import argparse
+import contextlib
+import io
+import json
+
+import numpy as np
+
+from face_tracking.tracker import CAMERA_HFOV_DEG, CAMERA_VFOV_DEG, FaceTracker
+from face_tracking.utils import setup_mock_servo
+
+W, H = 640, 480
+PX_PER_DEG = (W / CAMERA_HFOV_DEG, H / CAMERA_VFOV_DEG)
+FACE_SIZE = 120
+
+
+def face_path(seconds, fps, rng):
+    """World pan / tilt of the face (degrees) at every camera frame."""
+    t = np.arange(int(seconds * fps)) / fps
+    pan = 90 + 10 * np.sin(2 * np.pi * t / 7) + 3 * np.sin(2 * np.pi * t / 1.3)
+    tilt = 70 + 4 * np.sin(2 * np.pi * t / 11)
+    # 偶爾快速側身 / 起身：0.4 秒內移動 6-12 度
+    for start in rng.uniform(0, seconds, size=max(1, int(seconds / 5))):
+        ramp = np.clip((t - start) / 0.4, 0, 1)
+        pan += rng.choice([-1, 1]) * rng.uniform(6, 12) * ramp
+        tilt += rng.uniform(-4, 4) * ramp
+    return t, pan, tilt
+
+
+def detection_mask(n, fps, rng, miss_rate):
+    seen = rng.random(n) >= miss_rate
+    # 每 ~6 秒一段 0.1-0.4 秒完全偵測不到
+    for start in rng.uniform(0, n / fps, size=max(1, int(n / fps / 6))):
+        i = int(start * fps)
+        seen[i:i + int(rng.uniform(0.1, 0.4) * fps)] = False
+    return seen
+
+
+def simulate(smoothing, deadband, args, seed):
+    rng = np.random.default_rng(seed)
+    t, face_pan, face_tilt = face_path(args.seconds, args.fps, rng)
+    seen = detection_mask(len(t), args.fps, rng, args.miss_rate)
+    noise = rng.normal(0, args.noise_px, size=(len(t), 2))
+
+    now = [0.0]
+    tracker = FaceTracker(pwms=setup_mock_servo(), mode="detect", smoothing=smoothing,
+                          deadband=deadband, clock=lambda: now[0])
+    commands = [(0.0, tracker.pan_angle, tracker.tilt_angle)]   # (effective from, pan, tilt)
+    setpoint = np.array([tracker.detector.frame_width / 2, tracker.detector.frame_height / 2])
+
+    def camera_at(when):
+        for start, pan, tilt in reversed(commands):
+            if start <= when:
+                return pan, tilt
+        return commands[0][1:]
+
+    def face_px(i):
+        cam_pan, cam_tilt = camera_at(t[i])
+        # pan 變大臉往左、tilt 變大臉往下，跟 FaceTracker 的控制方向一致
+        return setpoint + ((face_pan[i] - cam_pan) * PX_PER_DEG[0], (cam_tilt - face_tilt[i]) * PX_PER_DEG[1])
+
+    latency = args.latency_ms / 1000
+    errors = []
+    next_free = 0.0      # servo loop 忙到什麼時候
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(len(t)):
+            pos = face_px(i)
+            errors.append(np.hypot(*(pos - setpoint)))
+            # servo loop 在上一幀處理完之前會跳過新的 frame (只拿最新的)
+            if t[i] < next_free:
+                continue
+            box = None
+            measured = pos + noise[i]
+            if seen[i] and 0 <= measured[0] < W and 0 <= measured[1] < H:
+                x, y = measured
+                box = (int(x - FACE_SIZE / 2), int(y - FACE_SIZE / 2), int(x + FACE_SIZE / 2), int(y + FACE_SIZE / 2))
+            now[0] = t[i] + latency
+            tracker.follow(box, t[i], (H, W))
+            commands.append((now[0] + args.servo_delay_ms / 1000, tracker.pan_angle, tracker.tilt_angle))
+            next_free = now[0] - args.camera_delay_ms / 1000
+
+    errors = np.asarray(errors)
+    return {
+        "smoothing": smoothing,
+        "deadband_deg": deadband,
+        "rms_px": round(float(np.sqrt(np.mean(errors ** 2))), 1),
+        "p95_px": round(float(np.percentile(errors, 95)), 1),
+        "max_px": round(float(errors.max()), 1),
+        "servo_commands": tracker.pan_pwm.commands + tracker.tilt_pwm.commands,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--latency-ms', type=float, default=60, help="capture -> servo command")
+    parser.add_argument('--camera-delay-ms', type=float, default=30,
+                        help="part of the latency before the frame reaches the servo loop")
+    parser.add_argument('--servo-delay-ms', type=float, default=30, help="command -> camera actually turned")
+    parser.add_argument('--noise-px', type=float, default=3.0, help="detector jitter of the face centre")
+    parser.add_argument('--miss-rate', type=float, default=0.05, help="random frames without a detection")
+    parser.add_argument('--deadband', type=float, nargs='+', default=[0.0, 0.3])
+    parser.add_argument('--seeds', type=int, default=3)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    rows = []
+    for smoothing in ("window", "kalman"):
+        for deadband in args.deadband:
+            runs = [simulate(smoothing, deadband, args, seed) for seed in range(args.seeds)]
+            row = dict(runs[0])
+            for key in ("rms_px", "p95_px", "max_px", "servo_commands"):
+                row[key] = round(float(np.mean([r[key] for r in runs])), 1)
+            rows.append(row)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'smoothing':<10}{'deadband':>9}{'rms px':>9}{'p95 px':>9}{'max px':>9}{'commands':>10}")
+    for row in rows:
+        print(f"{row['smoothing']:<10}{row['deadband_deg']:>9g}{row['rms_px']:>9}{row['p95_px']:>9}"
+              f"{row['max_px']:>9}{row['servo_commands']:>10}")
+
+
+if __name__ == '__main__':
+    main()
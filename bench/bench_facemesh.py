@@ -0,0 +1,181 @@
+"""FaceMesh cost per frame: the full frame (video mode) vs. a crop around the face.
+
+    python3 -m bench.bench_facemesh --source clip.mp4 --crop-size 256
+
+FocusAnalyzer runs a video-mode FaceMesh on the full frame. Once it has a
+face, MediaPipe crops it internally from the previous landmarks and skips
+the face detector, and the landmark model runs at a fixed input size, so
+cropping before FaceMesh has little left to save. Modes, on the same frames:
+
+    full          video-mode FaceMesh on the full frame (what the server does)
+    crop-static   static-image-mode FaceMesh on a padded square around the last
+                  face, resized to --crop-size (face detector on every crop)
+    crop-window   video-mode FaceMesh on a crop window that only moves when the
+                  face comes within --margin of its edge (tracking restarts then)
+
+The crop modes fall back to a full-frame video-mode FaceMesh while no face
+is known. Reports mean / p50 / p95 ms per frame, frames with a face, and the
+mean landmark distance (px) from full-frame mode.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO, 'backend'))
+
+from focus_analyzer import create_face_mesh  # noqa: E402
+from face_tracking.frame_source import open_source  # noqa: E402
+
+MODES = ("full", "crop-static", "crop-window")
+
+
+def landmarks_px(results, region, shape):
+    """First face's landmarks as an (N, 2) array of full-frame pixels, or None."""
+    if not results.multi_face_landmarks:
+        return None
+    h, w = shape[:2]
+    x1, y1, x2, y2 = region if region is not None else (0, 0, w, h)
+    points = np.array([(p.x, p.y) for p in results.multi_face_landmarks[0].landmark])
+    return points * (x2 - x1, y2 - y1) + (x1, y1)
+
+
+def face_box(points):
+    (x1, y1), (x2, y2) = points.min(axis=0), points.max(axis=0)
+    return int(x1), int(y1), int(x2), int(y2)
+
+
+def square_region(shape, box, pad):
+    """Padded square around `box`, shifted to stay inside the frame."""
+    h, w = shape[:2]
+    x1, y1, x2, y2 = box
+    side = min(int(max(x2 - x1, y2 - y1) * (1 + 2 * pad)), w, h)
+    if side < 16:
+        return None
+    rx = min(max(0, (x1 + x2) // 2 - side // 2), w - side)
+    ry = min(max(0, (y1 + y2) // 2 - side // 2), h - side)
+    return rx, ry, rx + side, ry + side
+
+
+class Full:
+    def __init__(self, args):
+        self.mesh = create_face_mesh()
+
+    def __call__(self, frame):
+        return landmarks_px(self.mesh.process(frame), None, frame.shape)
+
+
+class CropStatic:
+    def __init__(self, args):
+        self.size, self.pad = args.crop_size, args.pad
+        self.full = create_face_mesh()
+        self.crop_mesh = create_face_mesh(static_image_mode=True)
+        self.box = None
+
+    def crop(self, mesh, frame, region):
+        x1, y1, x2, y2 = region
+        crop = cv2.resize(frame[y1:y2, x1:x2], (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return landmarks_px(mesh.process(crop), region, frame.shape)
+
+    def __call__(self, frame):
+        region = square_region(frame.shape, self.box, self.pad) if self.box is not None else None
+        if region is not None:
+            points = self.crop(self.crop_mesh, frame, region)
+        else:
+            points = landmarks_px(self.full.process(frame), None, frame.shape)
+        self.box = face_box(points) if points is not None else None
+        return points
+
+
+class CropWindow(CropStatic):
+    def __init__(self, args):
+        super().__init__(args)
+        self.margin = args.margin
+        self.window = None
+        self.crop_mesh = None
+        self.moves = 0
+
+    def _inside(self, box):
+        x1, y1, x2, y2 = box
+        m = self.margin * (x2 - x1)
+        wx1, wy1, wx2, wy2 = self.window
+        return x1 - m >= wx1 and y1 - m >= wy1 and x2 + m <= wx2 and y2 + m <= wy2
+
+    def __call__(self, frame):
+        if self.box is not None and (self.window is None or not self._inside(self.box)):
+            self.window = square_region(frame.shape, self.box, self.pad)
+            # 視窗一動，video mode 的追蹤座標就不對了：重新開始
+            if self.crop_mesh is not None:
+                self.crop_mesh.close()
+            self.crop_mesh = create_face_mesh()
+            self.moves += 1
+        if self.window is not None:
+            points = self.crop(self.crop_mesh, frame, self.window)
+            if points is None:
+                self.window = None
+        else:
+            points = landmarks_px(self.full.process(frame), None, frame.shape)
+        self.box = face_box(points) if points is not None else None
+        return points
+
+
+def run(mode, frames, args, reference=None):
+    step = {"full": Full, "crop-static": CropStatic, "crop-window": CropWindow}[mode](args)
+    latencies, found, errors, landmarks = [], 0, [], []
+    for i, frame in enumerate(frames):
+        start = time.perf_counter()
+        points = step(frame)
+        latencies.append(time.perf_counter() - start)
+        landmarks.append(points)
+        found += points is not None
+        if reference is not None and points is not None and reference[i] is not None:
+            errors.append(float(np.linalg.norm(points - reference[i], axis=1).mean()))
+    # 前幾幀包含模型初始化
+    lat = np.asarray(latencies[args.warmup:]) * 1000
+    report = {"mean_ms": round(float(lat.mean()), 2),
+              "p50_ms": round(float(np.percentile(lat, 50)), 2),
+              "p95_ms": round(float(np.percentile(lat, 95)), 2),
+              "found": found}
+    if errors:
+        report["landmark_err_px"] = round(float(np.mean(errors)), 2)
+    if isinstance(step, CropWindow):
+        report["window_moves"] = step.moves
+    return report, landmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--source', required=True, help="video file or image directory")
+    parser.add_argument('--limit', type=int, default=300, help="frames to use (0: all)")
+    parser.add_argument('--flip', action='store_true', help="flip vertically first, like backend/server.py")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--crop-size', type=int, default=256)
+    parser.add_argument('--pad', type=float, default=0.35, help="padding around the face, fraction of its size")
+    parser.add_argument('--margin', type=float, default=0.15,
+                        help="crop-window: move the window when the face is closer than this to its edge")
+    parser.add_argument('--warmup', type=int, default=5, help="frames left out of the timing")
+    args = parser.parse_args()
+
+    frames = []
+    for frame in open_source(args.source):
+        frames.append(cv2.flip(frame, 0) if args.flip else frame)
+        if args.limit and len(frames) >= args.limit:
+            break
+
+    results = {"frames": len(frames), "modes": {}}
+    reference = None
+    if "full" in args.modes:
+        results["modes"]["full"], reference = run("full", frames, args)
+    for mode in args.modes:
+        if mode != "full":
+            results["modes"][mode], _ = run(mode, frames, args, reference)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
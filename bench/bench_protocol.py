@@ -0,0 +1,93 @@
+"""Compare the legacy JSON/base64 frame format with the binary protocol.
+
+Run from the repo root:
+
+    python3 -m bench.bench_protocol --frames 200 --width 800 --height 600
+
+Reports bytes per frame and the time spent wrapping (encode) and unwrapping
+(decode) one frame in each format. JPEG compression itself is identical for
+both formats and is reported separately. The last line shows the size of the
+edge-crop upload (face crop + downscaled frame) for a typical face box.
+"""
+import argparse
+import base64
+import json
+import time
+
+import cv2
+import numpy as np
+
+from backend.protocol import KIND_FRAME, CODEC_JPEG, encode_message, decode_message
+from face_tracking.client import encode_crop_frame
+
+
+def make_frame(width, height, seed=0):
+    """Synthetic camera-like frame: smooth gradient plus sensor noise."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (x[None, :] * 0.6 + y * 0.4)
+    frame = np.dstack([base, base[:, ::-1], np.flipud(base)])
+    frame += rng.normal(0, 12, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def json_encode(jpeg, seq):
+    return json.dumps({'frame': base64.b64encode(jpeg).decode()})
+
+
+def json_decode(msg):
+    data = json.loads(msg)
+    return np.frombuffer(base64.b64decode(data['frame']), np.uint8)
+
+
+def binary_encode(jpeg, seq, width, height):
+    return encode_message(KIND_FRAME, seq, time.time(), width, height, jpeg, codec=CODEC_JPEG)
+
+
+def binary_decode(msg):
+    _, _, payload = decode_message(msg)
+    return np.frombuffer(payload, np.uint8)
+
+
+def timeit(fn, n):
+    start = time.perf_counter()
+    for i in range(n):
+        out = fn(i)
+    return (time.perf_counter() - start) / n * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=600)
+    args = parser.parse_args()
+
+    frame = make_frame(args.width, args.height)
+    jpeg_ms, (_, jpeg) = timeit(lambda i: cv2.imencode('.jpg', frame), args.frames)
+    print(f"JPEG {args.width}x{args.height}: {jpeg.nbytes} bytes, encode {jpeg_ms:.3f} ms (shared by both formats)")
+
+    json_enc_ms, json_msg = timeit(lambda i: json_encode(jpeg, i), args.frames)
+    json_dec_ms, json_out = timeit(lambda i: json_decode(json_msg), args.frames)
+    bin_enc_ms, bin_msg = timeit(lambda i: binary_encode(jpeg, i, args.width, args.height), args.frames)
+    bin_dec_ms, bin_out = timeit(lambda i: binary_decode(bin_msg), args.frames)
+    assert np.array_equal(json_out, bin_out)
+
+    json_bytes = len(json_msg.encode())
+    bin_bytes = len(bin_msg)
+    print(f"{'format':<8}{'bytes/frame':>14}{'encode ms':>12}{'decode ms':>12}")
+    print(f"{'json':<8}{json_bytes:>14}{json_enc_ms:>12.3f}{json_dec_ms:>12.3f}")
+    print(f"{'binary':<8}{bin_bytes:>14}{bin_enc_ms:>12.3f}{bin_dec_ms:>12.3f}")
+    print(f"binary is {json_bytes / bin_bytes:.2f}x smaller on the wire")
+
+    face_w, face_h = args.width // 5, args.height // 3
+    fx, fy = (args.width - face_w) // 2, args.height // 4
+    crop_ms, crop_msg = timeit(
+        lambda i: encode_crop_frame(frame, i, (fx, fy, fx + face_w, fy + face_h)), args.frames)
+    print(f"edge crop ({face_w}x{face_h} face): {len(crop_msg)} bytes/frame, "
+          f"encode incl. JPEG {crop_ms:.3f} ms, {bin_bytes / len(crop_msg):.2f}x smaller than binary")
+
+
+if __name__ == '__main__':
+    main()
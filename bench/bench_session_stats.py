@@ -0,0 +1,65 @@
+"""Time the session analytics engine on long synthetic sessions.
+
+Run from the repo root:
+
+    python3 -m bench.bench_session_stats --hours 1 4 8 --fps 15
+
+The status stream is a simple Markov chain (long focused stretches with
+occasional distractions), timestamps have capture jitter and a few
+disconnect gaps. Reports the time to compute the statistics from stored
+status codes, and separately the one-off cost of encoding status strings
+(only needed for telemetry rows written before codes were stored), best of
+--repeat runs.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from face_tracking.status_codes import STATUS_CODES
+from session_stats import encode_statuses, session_stats
+
+STATUSES = list(STATUS_CODES) + ["Calibrating 1/30"]
+
+
+def make_session(hours, fps, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * fps)
+    ts = np.cumsum(rng.normal(1.0 / fps, 0.1 / fps, n).clip(0.2 / fps))
+    ts[rng.integers(0, n, 5)] += 30.0  # 斷線
+    # 每幀 2% 機率換狀態，一半回到 Focused
+    switch = rng.random(n) < 0.02
+    picks = np.where(rng.random(n) < 0.5, 0, rng.integers(1, len(STATUSES), n))
+    state_idx = picks[np.maximum.accumulate(np.where(switch, np.arange(n), 0))]
+    statuses = np.array(STATUSES, dtype=object)[state_idx]
+    scores = rng.uniform(0, 100, n)
+    return ts, statuses, scores
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--hours', type=float, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--fps', type=float, default=15)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'hours':>6}{'frames':>10}{'stats ms':>10}{'encode ms':>12}{'focused %':>11}{'interruptions':>15}")
+    for hours in args.hours:
+        ts, statuses, scores = make_session(hours, args.fps)
+        encode_ms, codes = best_of(lambda: encode_statuses(statuses), args.repeat)
+        stats_ms, stats = best_of(lambda: session_stats(ts, codes, scores), args.repeat)
+        print(f"{hours:>6g}{len(ts):>10}{stats_ms:>10.2f}{encode_ms:>12.2f}"
+              f"{stats['focused_ratio'] * 100:>11.1f}{stats['interruptions']:>15}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+"""Offline checks of the FrameCapture ring (face_tracking/capture.py), no camera needed.
+
+    python3 -m bench.check_capture
+
+Uses a synthetic source that stamps every frame with its number and writes
+it in two halves with a pause in between, so a frame that is overwritten
+while a reader holds it (or read half-written) shows up as a mixed array.
+Checks:
+
+  * a pinned frame is never overwritten, however far capture runs ahead
+  * readers never see a torn frame, and frames arrive in capture order
+  * with every slot pinned, the ring grows to max_buffers and then drops
+    (counted in `dropped`) until a frame is released
+  * stop() wakes up readers blocked in latest(), and the end of an
+    ImageDirSource reaches readers as EndOfStream
+
+Exits non-zero on the first failed check.
+"""
+import os
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from face_tracking.capture import FrameCapture
+from face_tracking.frame_source import EndOfStream, FrameSource, ImageDirSource
+
+SHAPE = (60, 80, 3)
+
+
+class StampSource(FrameSource):
+    """Frame n is filled with n, top half first; `delay` between the halves and after each frame."""
+
+    def __init__(self, delay=0.0005, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+
+    def _read(self, out=None):
+        frame = out if out is not None else np.empty(SHAPE, np.uint32)
+        stamp = self.frames + 1
+        frame[:SHAPE[0] // 2] = stamp
+        time.sleep(self.delay)
+        frame[SHAPE[0] // 2:] = stamp
+        time.sleep(self.delay)
+        return frame
+
+    def _rewind(self):
+        pass
+
+
+def check(name, ok, detail=""):
+    if not ok:
+        raise SystemExit(f"FAIL {name} {detail}")
+    print(f"ok   {name} {detail}")
+
+
+def stamp_of(frame):
+    """The frame's stamp, or None when the array mixes two frames."""
+    values = np.unique(frame.array)
+    return int(values[0]) if values.size == 1 else None
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def check_pinned_never_overwritten():
+    capture = FrameCapture(StampSource(), buffers=3).start()
+    try:
+        pinned = capture.latest(timeout=2)
+        stamp = stamp_of(pinned)
+        # capture 跑在前面很多幀，同時另一個 reader 不停地拿新的
+        reader = capture.reader()
+        shared = 0
+        target = pinned.seq + 200
+        while capture.seq < target:
+            frame = reader.read(timeout=2)
+            shared += frame.array is pinned.array
+            frame.release()
+        check("pinned frame unchanged", stamp is not None and stamp_of(pinned) == stamp,
+              f"(stamp {stamp} after {capture.seq - pinned.seq} more frames)")
+        check("pinned buffer not handed out again", shared == 0)
+        pinned.release()
+    finally:
+        capture.stop()
+
+
+def check_no_torn_frames():
+    capture = FrameCapture(StampSource(), buffers=3).start()
+    try:
+        readers = [capture.reader(), capture.reader(max_fps=200)]
+        results = []
+
+        def consume(reader):
+            torn = out_of_order = frames = 0
+            last = 0
+            deadline = time.monotonic() + 1.0
+            while time.monotonic() < deadline:
+                frame = reader.read(timeout=1)
+                with frame:
+                    # 拿著 frame 時 capture 還在寫別的 slot
+                    time.sleep(0.001)
+                    stamp = stamp_of(frame)
+                torn += stamp is None
+                out_of_order += stamp is not None and stamp <= last
+                last = stamp or last
+                frames += 1
+            results.append((torn, out_of_order, frames))
+
+        threads = [threading.Thread(target=consume, args=(reader,)) for reader in readers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        frames = sum(r[2] for r in results)
+        check("no torn frames", all(r[0] == 0 for r in results), f"({frames} frames, 2 readers)")
+        check("frames in capture order", all(r[1] == 0 for r in results))
+    finally:
+        capture.stop()
+
+
+def check_growth_and_drops():
+    capture = FrameCapture(StampSource(), buffers=3).start()
+    try:
+        reader = capture.reader()
+        held = [reader.read(timeout=2) for _ in range(capture.max_buffers)]
+        check("ring grew to max_buffers", len(capture._slots) == capture.max_buffers,
+              f"({len(capture._slots)} slots)")
+        check("held frames are distinct buffers", len({id(f.array) for f in held}) == len(held))
+        dropped, seq = capture.dropped, capture.seq
+        check("drops while every slot is pinned", wait_for(lambda: capture.dropped >= dropped + 20),
+              f"({capture.dropped - dropped} dropped)")
+        check("no new frames published while full", capture.seq == seq)
+        check("held frames intact", all(stamp_of(f) is not None for f in held))
+        for frame in held:
+            frame.release()
+        check("capture resumes after release", wait_for(lambda: capture.seq > seq + 10))
+        check("no more slots than max_buffers", len(capture._slots) == capture.max_buffers)
+    finally:
+        capture.stop()
+
+
+def check_stop_unblocks_readers():
+    capture = FrameCapture(StampSource(delay=0.05), buffers=3).start()
+    outcome = []
+
+    def blocked():
+        try:
+            # 永遠等不到的 seq：只有 stop() 能叫醒
+            outcome.append(capture.latest(after=10 ** 9, timeout=None))
+        except EndOfStream:
+            outcome.append("EndOfStream")
+
+    thread = threading.Thread(target=blocked)
+    thread.start()
+    time.sleep(0.2)
+    start = time.monotonic()
+    capture.stop()
+    thread.join(timeout=2)
+    check("stop() wakes a blocked reader", not thread.is_alive() and outcome == ["EndOfStream"],
+          f"({time.monotonic() - start:.2f} s)")
+
+
+def check_image_dir_end_of_stream():
+    with tempfile.TemporaryDirectory() as path:
+        for i in range(5):
+            cv2.imwrite(os.path.join(path, f"{i:03d}.png"), np.full((48, 64, 3), 10 * (i + 1), np.uint8))
+        capture = FrameCapture(ImageDirSource(path), buffers=2).start()
+        reader = capture.reader()
+        seen = []
+        try:
+            while True:
+                frame = reader.read(timeout=2)
+                if frame is None:
+                    break
+                with frame:
+                    seen.append(int(frame.array[0, 0, 0]))
+                    check_uniform = np.unique(frame.array).size == 1
+                if not check_uniform:
+                    check("image frames intact", False, f"(frame {frame.seq})")
+        except EndOfStream:
+            seen.append("end")
+        finally:
+            capture.stop()
+        values = [v for v in seen if v != "end"]
+        check("ImageDirSource ends with EndOfStream", seen[-1:] == ["end"] and capture.ended,
+              f"({len(values)} frames read, {reader.skipped} skipped)")
+        check("image frames in order", values == sorted(values) and set(values) <= {10, 20, 30, 40, 50})
+
+
+def main():
+    check_pinned_never_overwritten()
+    check_no_torn_frames()
+    check_growth_and_drops()
+    check_stop_unblocks_readers()
+    check_image_dir_end_of_stream()
+    print("all capture checks passed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Load test: read-endpoint latency while the tracker is being toggled.
+
+Start the API first (e.g. `python3 serve.py --threads 16`), then from the
+repo root:
+
+    python3 -m bench.load_test --url http://127.0.0.1:8000 --clients 16 --duration 20
+
+`--clients` threads poll /rank and /status/<user> in a loop while another
+thread toggles the tracker on and off every `--toggle-every` seconds. Each
+request is classified by whether a toggle request was in flight when it
+started, and latency percentiles are reported per endpoint for both cases.
+With the production server they should stay close to each other; with a
+single-threaded server the "toggling" column blows up.
+
+The toggles have to really start and stop the tracker, so the API must run
+with the device. If /button/toggle answers anything but 2xx (e.g. 503 from
+`serve.py --no-device`), the run stops and exits with an error instead of
+reporting a "toggling" phase that had no toggle load.
+"""
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+
+def fetch(url, method="GET", timeout=30.0):
+    request = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--user', default='Allen')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--toggle-every', type=float, default=2.0)
+    args = parser.parse_args()
+
+    endpoints = {"rank": f"{args.url}/rank", "status": f"{args.url}/status/{args.user}"}
+    stop = threading.Event()
+    toggling = threading.Event()
+    samples = []          # (endpoint, toggling, latency s, http status)
+    toggles = []          # latency of each accepted toggle request
+    rejected = []         # http status of a toggle that did not go through
+    lock = threading.Lock()
+
+    def client(index):
+        names = list(endpoints)
+        i = index
+        while not stop.is_set():
+            name = names[i % len(names)]
+            i += 1
+            during = toggling.is_set()
+            start = time.perf_counter()
+            status = fetch(endpoints[name])
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append((name, during or toggling.is_set(), elapsed, status))
+
+    def toggler():
+        while not stop.wait(args.toggle_every):
+            toggling.set()
+            start = time.perf_counter()
+            status = fetch(f"{args.url}/button/toggle", method="POST")
+            elapsed = time.perf_counter() - start
+            toggling.clear()
+            if not 200 <= status < 300:
+                # tracker 沒有真的切換：量到的 "toggling" 沒有意義，直接結束
+                rejected.append(status)
+                stop.set()
+                return
+            toggles.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    threads.append(threading.Thread(target=toggler))
+    for thread in threads:
+        thread.start()
+    stop.wait(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    # 讓 tracker 回到關閉狀態
+    if len(toggles) % 2:
+        fetch(f"{args.url}/button/toggle", method="POST")
+    if rejected:
+        raise SystemExit(f"/button/toggle answered {rejected[0]} after {len(toggles)} accepted toggles: "
+                         "the tracker is not being toggled (API started with --no-device?)")
+
+    errors = sum(1 for *_, status in samples if status >= 500)
+    toggle_ms = np.percentile(toggles, 50) * 1000 if toggles else 0.0
+    print(f"{len(samples)} requests in {args.duration:g}s ({len(samples) / args.duration:.0f} req/s), "
+          f"{errors} errors, {len(toggles)} toggles (p50 {toggle_ms:.0f} ms)")
+    print(f"{'endpoint':<10}{'phase':<10}{'n':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name in endpoints:
+        for phase, during in (("idle", False), ("toggling", True)):
+            lat = np.array([s[2] for s in samples if s[0] == name and s[1] == during]) * 1000
+            if lat.size == 0:
+                continue
+            p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+            print(f"{name:<10}{phase:<10}{lat.size:>7}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
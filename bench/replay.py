@@ -0,0 +1,278 @@
+"""Replay recorded frames through the analysis pipeline, without a Pi.
+
+Run from the repo root:
+
+    python3 -m bench.replay --source clip.mp4 --stages analyzer tracker loop --out replay.json
+
+--source is a video file or a directory of images (face_tracking/frame_source.py).
+Stages:
+
+    analyzer  FocusAnalyzer.process_frame on every frame (in this process)
+    tracker   FaceTracker.track with mock servos (--face-mode hybrid|detect,
+              --smoothing kalman|window)
+    loop      FaceTracker + PipelinedClient -> backend/server.py over localhost,
+              latency is the round trip of each frame; the server is started
+              for the run unless --server points at a running one
+
+Prints one JSON object with fps, p50/p95/p99/mean per-frame latency (ms) and
+peak RSS (MB) per stage, plus the commit, so runs can be compared between
+commits. Stages run in a fresh subprocess each so peak RSS is per stage; a
+stage that runs longer than --stage-timeout is stopped and reported as an
+error.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ("analyzer", "tracker", "loop")
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # Linux 回傳 KB
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def summarize(latencies, elapsed, frames):
+    lat = np.asarray(latencies) * 1000
+    report = {"frames": frames, "seconds": round(elapsed, 3),
+              "fps": round(frames / elapsed, 2) if elapsed else 0.0}
+    if lat.size:
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        report["latency_ms"] = {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2),
+                                "mean": round(float(lat.mean()), 2)}
+    return report
+
+
+def open_frames(args):
+    from face_tracking.frame_source import open_source
+    size = tuple(args.size) if args.size else None
+    return open_source(args.source, size=size, fps=args.fps or None)
+
+
+def frames_of(source, limit):
+    for i, frame in enumerate(source):
+        if limit and i >= limit:
+            return
+        yield frame
+
+
+def run_analyzer(args):
+    sys.path.insert(0, os.path.join(REPO, 'backend'))
+    import cv2
+    from focus_analyzer import FocusAnalyzer
+
+    analyzer = FocusAnalyzer()
+    latencies = []
+    start = time.perf_counter()
+    for frame in frames_of(open_frames(args), args.limit):
+        t = time.perf_counter()
+        # 跟 server.py 一樣先上下翻轉
+        analyzer.process_frame(cv2.flip(frame, 0))
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - start, len(latencies))
+
+
+def make_tracker(args):
+    from face_tracking.tracker import FaceTracker
+    from face_tracking.utils import setup_mock_servo
+    return FaceTracker(pwms=setup_mock_servo(), mode=args.face_mode, detect_every=args.detect_every,
+                       smoothing=args.smoothing)
+
+
+def run_tracker(args):
+    import cv2
+
+    tracker = make_tracker(args)
+    latencies = []
+    start = time.perf_counter()
+    for frame in frames_of(open_frames(args), args.limit):
+        t = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.track(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        latencies.append(time.perf_counter() - t)
+    report = summarize(latencies, time.perf_counter() - start, len(latencies))
+    report["servo_commands"] = tracker.pan_pwm.commands + tracker.tilt_pwm.commands
+    follower = tracker.follower
+    report["detector_calls"] = follower.detections if follower is not None else len(latencies)
+    if follower is not None:
+        report["redetects"] = follower.redetects
+    return report
+
+
+def wait_for_port(port, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with contextlib.suppress(OSError), socket.create_connection(("127.0.0.1", port), timeout=0.5):
+            return
+        time.sleep(0.2)
+    raise TimeoutError(f"backend did not open port {port}")
+
+
+def start_server(args):
+    # 自己一個 process group：server 的 worker process 也能一起收掉
+    server = subprocess.Popen([sys.executable, os.path.join(REPO, 'backend', 'server.py'),
+                               '--host', '127.0.0.1', '--port', str(args.port), '--warm',
+                               '--stats-interval', '0', *args.server_args],
+                              cwd=REPO, stdout=subprocess.DEVNULL, start_new_session=True)
+    try:
+        wait_for_port(args.port)
+    except BaseException:
+        stop_server(server)
+        raise
+    return server
+
+
+def stop_server(server, timeout=10.0):
+    """SIGINT lets server.py shut its engine down; whatever is left of its process group is killed."""
+    with contextlib.suppress(ProcessLookupError):
+        server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+    # 留下來的 worker 會一直開著 stage 的 stderr，harness 就等不到 stage 結束
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(server.pid, signal.SIGKILL)
+
+
+def run_loop(args):
+    import cv2
+    import websocket
+    from face_tracking.client import PipelinedClient
+
+    server = None
+    url = args.server
+    if url is None:
+        server = start_server(args)
+        url = f"ws://127.0.0.1:{args.port}"
+
+    latencies = []
+    done = threading.Condition()
+    client = None
+    submitted = 0
+    try:
+        tracker = None if args.no_tracker else make_tracker(args)
+        ws = websocket.WebSocket()
+        ws.connect(url)
+
+        def on_reply(seq, rtt):
+            with done:
+                latencies.append(rtt)
+                done.notify_all()
+
+        client = PipelinedClient(ws, on_reply=on_reply)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for frame in frames_of(open_frames(args), args.limit):
+                if tracker is not None:
+                    tracker.track(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                client.submit(frame, tracker.face_box if tracker is not None else None)
+                submitted += 1
+            # 等最後幾個在路上的結果
+            with done:
+                done.wait_for(lambda: client.received >= client.sent, timeout=5.0)
+        elapsed = time.perf_counter() - start
+    finally:
+        if client is not None:
+            client.close()
+        if server is not None:
+            stop_server(server)
+
+    report = summarize(latencies, elapsed, len(latencies))
+    report.update(submitted=submitted, sent=client.sent, dropped=client.dropped,
+                  bytes_sent=client.bytes_sent)
+    if server is not None:
+        report["server_peak_rss_mb"] = round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1)
+    return report
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stage(cmd, timeout):
+    """Run one stage subprocess; returns (report, error)."""
+    proc = subprocess.Popen(cmd, cwd=REPO, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout or None)
+    except subprocess.TimeoutExpired:
+        # SIGTERM：stage 會先把它開的 server 關掉
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+        return None, [f"timed out after {timeout:g} s"]
+    if proc.returncode != 0:
+        return None, stderr.strip().splitlines()[-1:]
+    return json.loads(stdout.strip().splitlines()[-1]), None
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--source', required=True, help="video file or image directory")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--limit', type=int, default=0, help="max frames per stage (0: all)")
+    parser.add_argument('--size', type=int, nargs=2, metavar=('W', 'H'), default=None,
+                        help="resize frames, e.g. 800 600 like the Pi camera")
+    parser.add_argument('--fps', type=float, default=0,
+                        help="pace the source like a camera (0: as fast as possible)")
+    parser.add_argument('--server', default=None, help="ws:// URL of a running backend (loop stage)")
+    parser.add_argument('--port', type=int, default=8799, help="port for the backend started by the loop stage")
+    parser.add_argument('--server-args', nargs=argparse.REMAINDER, default=[],
+                        help="extra backend/server.py arguments (must come last)")
+    parser.add_argument('--face-mode', choices=["hybrid", "detect"], default="hybrid",
+                        help="FaceTracker: detector + optical flow, or detector on every frame")
+    parser.add_argument('--detect-every', type=int, default=10, help="hybrid mode: frames between detections")
+    parser.add_argument('--smoothing', choices=["kalman", "window"], default="kalman",
+                        help="FaceTracker: Kalman predictor or 5-frame average of the face centre")
+    parser.add_argument('--no-tracker', action='store_true', help="loop stage without FaceTracker")
+    parser.add_argument('--stage-timeout', type=float, default=600,
+                        help="seconds before a stage is stopped and reported as an error (0: no limit)")
+    parser.add_argument('--out', default=None, help="also write the JSON report here")
+    parser.add_argument('--stage', default=None, help=argparse.SUPPRESS)  # internal: run one stage
+    args = parser.parse_args()
+
+    if args.stage:
+        # harness 逾時會送 SIGTERM：變成 SystemExit，finally 才會把 server 關掉
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(1))
+        report = {"analyzer": run_analyzer, "tracker": run_tracker, "loop": run_loop}[args.stage](args)
+        report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        print(json.dumps(report))
+        return
+
+    results = {"commit": git_commit(), "source": args.source, "stages": {}}
+    for stage in args.stages:
+        # 每個 stage 一個新的 process，peak RSS 才不會互相影響
+        cmd = [sys.executable, '-m', 'bench.replay', '--stage', stage, *sys.argv[1:]]
+        report, error = run_stage(cmd, args.stage_timeout)
+        results["stages"][stage] = report if error is None else {"error": error}
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Threaded camera capture into a small ring of reused buffers.
+
+A FrameCapture thread keeps pulling frames from a source (Picamera2, or a
+face_tracking/frame_source.py stand-in) into `buffers` slots and publishes
+the newest one with a sequence number. Consumers each open a FrameReader
+with their own rate limit (servo tracking, uplink, preview, ...) and get the
+newest frame they have not seen yet, without a copy:
+
+    capture = FrameCapture(PicameraSource(camera=picamera2)).start()
+    reader = capture.reader(max_fps=8)
+    frame = reader.read(timeout=0.5)      # Frame or None
+    if frame is not None:
+        with frame:                       # released at the end of the block
+            tracker.track(frame.array)
+
+A Frame pins its slot until `release()`, so the capture thread never writes
+into a buffer somebody is still reading; it writes into the oldest free slot
+instead. If every slot is pinned, one more is added (up to twice `buffers`)
+before frames start being dropped. Buffers are allocated by the first frames
+and reused after that. Frame.timestamp is the capture time on `capture.clock`.
+"""
+import threading
+import time
+
+from backend.metrics import metrics
+from face_tracking.frame_source import EndOfStream
+
+
+class Clock:
+    """Monotonic seconds since the clock was created; shared by capture and the loops reading it."""
+
+    def __init__(self):
+        self.origin = time.monotonic()
+
+    def __call__(self):
+        return time.monotonic() - self.origin
+
+
+class _Slot:
+    __slots__ = ("array", "seq", "timestamp", "pins")
+
+    def __init__(self):
+        self.array = None
+        self.seq = 0
+        self.timestamp = 0.0
+        self.pins = 0
+
+
+class Frame:
+    """A pinned view of one captured frame; `release()` (or `with frame:`) when done."""
+    __slots__ = ("seq", "timestamp", "array", "_capture", "_slot")
+
+    def __init__(self, capture, slot):
+        self._capture = capture
+        self._slot = slot
+        self.seq = slot.seq
+        self.timestamp = slot.timestamp
+        self.array = slot.array
+
+    def release(self):
+        if self._slot is not None:
+            self._capture._unpin(self._slot)
+            self._slot = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+class FrameCapture:
+    def __init__(self, source, buffers=3, clock=None):
+        self.source = source
+        self.clock = clock or Clock()   # Frame.timestamp 用這個時鐘
+        # Picamera2 本身只有 capture_array()，每次都會配置新的 array
+        self._capture_into = getattr(source, "capture_into", None)
+        self.max_buffers = max(2, buffers) * 2
+        self._slots = [_Slot() for _ in range(max(2, buffers))]
+        self._latest = None
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.ended = False
+        self.error = None
+        self.dropped = 0        # frames captured while every buffer was pinned
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="capture", daemon=True)
+        self._thread.start()
+        return self
+
+    def _free_slot(self):
+        free = [slot for slot in self._slots if slot.pins == 0 and slot is not self._latest]
+        if free:
+            return min(free, key=lambda slot: slot.seq)
+        if len(self._slots) < self.max_buffers:
+            self._slots.append(_Slot())
+            return self._slots[-1]
+        return None
+
+    def _grab(self, out):
+        if self._capture_into is not None:
+            return self._capture_into(out)
+        return self.source.capture_array()
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                with self._cond:
+                    slot = self._free_slot()
+                # 寫入的 slot 沒有被任何 reader 持有，也不是 latest，所以在鎖外寫
+                with metrics.span("capture"):
+                    array = self._grab(slot.array if slot is not None else None)
+                if slot is None:
+                    self.dropped += 1
+                    continue
+                with self._cond:
+                    self._seq += 1
+                    slot.array, slot.seq, slot.timestamp = array, self._seq, self.clock()
+                    self._latest = slot
+                    self._cond.notify_all()
+        except EndOfStream:
+            self.ended = True
+        except Exception as e:
+            print("Capture failed:", e)
+            self.error = e
+        finally:
+            with self._cond:
+                self._stopped.set()
+                self._cond.notify_all()
+
+    def _unpin(self, slot):
+        with self._cond:
+            slot.pins -= 1
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def latest(self, after=0, timeout=None):
+        """Pin and return the newest frame with seq > `after`, or None on timeout.
+
+        Raises EndOfStream once the source is exhausted (or failed) and no
+        newer frame is left.
+        """
+        with self._cond:
+            ready = lambda: (self._latest is not None and self._latest.seq > after) or self._stopped.is_set()
+            if not self._cond.wait_for(ready, timeout):
+                return None
+            slot = self._latest
+            if slot is None or slot.seq <= after:
+                raise EndOfStream
+            slot.pins += 1
+            return Frame(self, slot)
+
+    def reader(self, max_fps=None):
+        return FrameReader(self, max_fps)
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        if hasattr(self.source, "close"):
+            self.source.close()
+
+
+class FrameReader:
+    """One consumer: newest unseen frame, at most `max_fps` per second (None: every new frame)."""
+
+    def __init__(self, capture, max_fps=None):
+        self.capture = capture
+        self.max_fps = max_fps
+        self.last_seq = 0
+        self.frames = 0
+        self.skipped = 0        # captured frames this consumer never saw
+        self._next_at = None
+
+    def read(self, timeout=None):
+        if self.max_fps:
+            now = time.monotonic()
+            if self._next_at is not None and self._next_at > now:
+                time.sleep(self._next_at - now)
+        frame = self.capture.latest(self.last_seq, timeout)
+        if frame is None:
+            return None
+        if self.last_seq:
+            self.skipped += frame.seq - self.last_seq - 1
+        self.last_seq = frame.seq
+        self.frames += 1
+        if self.max_fps:
+            now = time.monotonic()
+            self._next_at = max(now, self._next_at or now) + 1.0 / self.max_fps
+        return frame
@@ -1,29 +1,300 @@
 import cv2
 import base64
 import json
-import numpy as np
+import threading
+import time
+import websocket
+from backend.metrics import metrics
+from backend.overlay import draw_overlay
+from face_tracking.latest_frame import latest_frame
+from face_tracking.status_events import status_bus
+from face_tracking.telemetry import telemetry
+from backend.protocol import (
+    KIND_FRAME, KIND_RESULT, CODEC_JPEG, CODEC_NONE, FLAG_META_ONLY,
+    decode_message, encode_crop_message, encode_message,
+)
+
 tracking_status = "Not Running!"
-processed_frame = None
-def Client(frame ,ws):
-    global tracking_status, processed_frame
+
+# "frame": the server sends back an annotated JPEG for every frame
+# "meta": the server only sends score / status / boxes / landmarks (binary protocol only);
+#         the overlay is drawn here, and only when a photo is actually requested
+REPLY_MODE = "frame"
+
+# True: binary frames (backend/protocol.py); False: legacy JSON + base64
+USE_BINARY_PROTOCOL = True
+_seq = 0
+
+# "full": upload the whole frame
+# "crop": full-resolution face crop + heavily downscaled frame (binary protocol only)
+UPLINK_MODE = "full"
+CROP_PAD = 0.35         # padding around the detected face box
+CROP_DOWNSCALE = 4      # full frame is shrunk by this factor (only used for phone detection)
+CROP_SMALL_QUALITY = 60
+
+
+def encode_crop_frame(frame, seq, face_box, flags=0):
+    """Edge-crop uplink: send the face region at full resolution plus a small full frame."""
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = face_box
+    pad_x, pad_y = int((x2 - x1) * CROP_PAD), int((y2 - y1) * CROP_PAD)
+    x1, y1 = max(0, int(x1) - pad_x), max(0, int(y1) - pad_y)
+    x2, y2 = min(w, int(x2) + pad_x), min(h, int(y2) + pad_y)
+
+    _, crop_jpeg = cv2.imencode('.jpg', frame[y1:y2, x1:x2])
+    small = cv2.resize(frame, (w // CROP_DOWNSCALE, h // CROP_DOWNSCALE), interpolation=cv2.INTER_AREA)
+    _, small_jpeg = cv2.imencode('.jpg', small, [cv2.IMWRITE_JPEG_QUALITY, CROP_SMALL_QUALITY])
+    return encode_crop_message(seq, time.time(), w, h, crop_jpeg, small_jpeg, (x1, y1, x2, y2), flags)
+
+
+def encode_frame(frame, seq, binary=True, face_box=None, meta_only=False):
+    """Encode one captured frame for the uplink; a `face_box` selects the edge-crop format."""
+    flags = FLAG_META_ONLY if meta_only else 0
+    if binary and face_box is not None and face_box[2] > face_box[0] and face_box[3] > face_box[1]:
+        return encode_crop_frame(frame, seq, face_box, flags)
     _, jpeg = cv2.imencode('.jpg', frame)
-    frame_b64 = base64.b64encode(jpeg.tobytes()).decode()
+    if binary:
+        h, w = frame.shape[:2]
+        return encode_message(KIND_FRAME, seq, time.time(), w, h, jpeg, codec=CODEC_JPEG, flags=flags)
+    return json.dumps({'frame': base64.b64encode(jpeg).decode()})
 
-    ws.send(json.dumps({'frame': frame_b64}))
+
+def decode_reply(resp):
+    """Decode a server reply. Returns (seq or None, annotated JPEG bytes or None, result dict).
+
+    The annotated JPEG is passed on as-is; it is never decoded on the device.
+    """
+    if isinstance(resp, (bytes, bytearray)):
+        header, meta, payload = decode_message(resp)
+        if header.kind != KIND_RESULT:
+            raise ValueError(f"unexpected message kind {header.kind}")
+        jpeg = None
+        if header.codec != CODEC_NONE:
+            jpeg = payload.tobytes()
+        return header.seq, jpeg, meta
+
+    data = json.loads(resp)
+    jpeg = base64.b64decode(data['frame'])
+    return None, jpeg, {'score': data['score'], 'status': data['status']}
+
+
+def Client(frame ,ws):
+    global _seq
+    _seq += 1
+    with metrics.span("encode"):
+        msg = encode_frame(frame, _seq, USE_BINARY_PROTOCOL)
+    sent_at = time.perf_counter()
+    if USE_BINARY_PROTOCOL:
+        ws.send(msg, opcode=websocket.ABNF.OPCODE_BINARY)
+    else:
+        ws.send(msg)
 
     # 收 server 回傳
     resp = ws.recv()
     try:
-        data = json.loads(resp)
-    except json.JSONDecodeError:
-        print("Failed to decode JSON response")
+        with metrics.span("decode"):
+            _, jpeg, result = decode_reply(resp)
+    except (ValueError, KeyError) as e:
+        print("Failed to decode response:", e)
         return None
-    processed_bytes = base64.b64decode(data['frame'])
-    processed_frame = cv2.imdecode(np.frombuffer(processed_bytes, np.uint8), cv2.IMREAD_COLOR)
 
-    
-    print(f"Score: {data['score']}, Status: {data['status']}")
-    tracking_status = data['status']
-    #cv2.imshow("Processed Frame", processed_frame)
+    observe_round_trip(time.perf_counter() - sent_at, result)
+    with metrics.span("apply"):
+        _apply_result(jpeg, result)
+
+
+def observe_round_trip(rtt, result):
+    """Round trip of one frame; "network" is what is left after the server's own time
+    (transfer, plus the JPEG encode / send on both ends)."""
+    metrics.observe("round_trip", rtt)
+    server_ms = result.get("server_ms")
+    if server_ms is not None:
+        metrics.observe("network", max(0.0, rtt - server_ms / 1000))
+
+
+def render_overlay(raw_frame, result):
+    """JPEG of `raw_frame` with the overlay of a metadata-only result."""
+    # the server analyses the vertically flipped frame, draw in the same orientation
+    frame = draw_overlay(cv2.flip(raw_frame, 0), result)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+def _apply_result(jpeg, result, raw_frame=None):
+    global tracking_status
+    print(f"Score: {result['score']}, Status: {result['status']}")
+    tracking_status = result['status']
+    # 分數以整數推送，小數抖動不算變化
+    status_bus.update(tracker_status=tracking_status, score=int(result['score']))
+    telemetry.record(result['score'], result['status'], result.get('phone', False))
+    if jpeg is not None:
+        latest_frame.publish(jpeg=jpeg)
+    elif raw_frame is not None:
+        # 只記下來，等有人要看照片時才畫
+        latest_frame.publish(render=lambda: render_overlay(raw_frame, result))
+
+
+class PipelinedClient:
+    """Non-lockstep uplink: a sender and a receiver thread share one WebSocket.
+
+    `submit()` never blocks. Only the newest submitted frame is kept; if it is
+    not sent before the next one arrives it is dropped. At most `window` frames
+    are in flight, replies are matched by sequence number, and only a result
+    newer than the last applied one updates `tracking_status` / latest photo.
+    With reply_mode="meta" the raw frame is kept until its reply arrives so the
+    overlay can be drawn later, when latest_frame is read.
+
+    Frames pinned in a capture buffer (face_tracking/capture.py) are submitted
+    with their `release`, which is called once the frame is encoded or
+    replaced, so the buffer goes back to the camera without a copy.
+    """
+
+    def __init__(self, ws, window=2, binary=USE_BINARY_PROTOCOL, in_flight_timeout=2.0,
+                 mode=UPLINK_MODE, reply_mode=REPLY_MODE, on_reply=None):
+        self.ws = ws
+        self.on_reply = on_reply   # on_reply(seq, round-trip seconds), e.g. for bench/replay.py
+        self.window = max(1, window)
+        self.binary = binary
+        self.crop = binary and mode == "crop"
+        self.meta_only = binary and reply_mode == "meta"
+        self.in_flight_timeout = in_flight_timeout
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._in_flight = {}    # seq -> (send time, raw frame kept for meta-only replies)
+        self._next_seq = 0
+        self._applied_seq = 0
+        self._closed = False
+
+        self.sent = 0
+        self.bytes_sent = 0
+        self.received = 0
+        self.dropped = 0        # frames replaced before they could be sent
+        self.stale = 0          # replies older than an already applied one
+
+        self._sender = threading.Thread(target=self._send_loop, daemon=True)
+        self._receiver = threading.Thread(target=self._recv_loop, daemon=True)
+        self._sender.start()
+        self._receiver.start()
+
+    def submit(self, frame, face_box=None, release=None):
+        """Queue `frame` for upload; `face_box` (x1, y1, x2, y2) is used in crop mode.
+
+        `release()` is called once the client no longer needs `frame`.
+        """
+        if release is not None and self.meta_only:
+            # meta 模式要留著原圖畫 overlay，不能佔住 capture buffer
+            frame = frame.copy()
+            release()
+            release = None
+        with self._cond:
+            if self._closed:
+                replaced = (frame, face_box, release)
+            else:
+                replaced, self._pending = self._pending, (frame, face_box, release)
+                if replaced is not None:
+                    self.dropped += 1
+                    metrics.inc("uplink_dropped_total", help="Frames replaced before they were sent.")
+                self._cond.notify_all()
+        if replaced is not None and replaced[2] is not None:
+            replaced[2]()
+
+    def _expire_in_flight(self, now):
+        for seq, (sent_at, _) in list(self._in_flight.items()):
+            if now - sent_at > self.in_flight_timeout:
+                del self._in_flight[seq]
+
+    def _send_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and (self._pending is None or len(self._in_flight) >= self.window):
+                    self._cond.wait(timeout=self.in_flight_timeout)
+                    self._expire_in_flight(time.time())
+                if self._closed:
+                    return
+                (frame, face_box, release), self._pending = self._pending, None
+                self._next_seq += 1
+                seq = self._next_seq
+                self._in_flight[seq] = (time.time(), frame if self.meta_only else None)
+
+            try:
+                try:
+                    with metrics.span("encode"):
+                        msg = encode_frame(frame, seq, self.binary, face_box if self.crop else None,
+                                           self.meta_only)
+                finally:
+                    if release is not None:
+                        release()
+                self.bytes_sent += len(msg)
+                with metrics.span("send"):
+                    if self.binary:
+                        self.ws.send(msg, opcode=websocket.ABNF.OPCODE_BINARY)
+                    else:
+                        self.ws.send(msg)
+                self.sent += 1
+                metrics.inc("uplink_frames_total", help="Frames sent to the backend.")
+            except Exception as e:
+                print("Uplink send failed:", e)
+                self.close()
+                return
+
+    def _recv_loop(self):
+        while not self._closed:
+            try:
+                resp = self.ws.recv()
+            except Exception as e:
+                if not self._closed:
+                    print("Uplink receive failed:", e)
+                    self.close()
+                return
+            if self._closed:
+                return
+            received_at = time.time()
+            try:
+                with metrics.span("decode"):
+                    seq, jpeg, result = decode_reply(resp)
+            except (ValueError, KeyError) as e:
+                print("Failed to decode response:", e)
+                continue
+
+            with self._cond:
+                if seq is None:
+                    # legacy JSON replies carry no seq; the server answers in order
+                    seq = min(self._in_flight) if self._in_flight else self._applied_seq + 1
+                sent_at, raw_frame = self._in_flight.get(seq, (None, None))
+                # replies come back in order, anything older than seq is lost
+                for s in [s for s in self._in_flight if s <= seq]:
+                    del self._in_flight[s]
+                newest = seq > self._applied_seq
+                if newest:
+                    self._applied_seq = seq
+                else:
+                    self.stale += 1
+                self.received += 1
+                self._cond.notify_all()
+
+            if sent_at is not None:
+                observe_round_trip(received_at - sent_at, result)
+                if self.on_reply is not None:
+                    self.on_reply(seq, received_at - sent_at)
+
+            if newest:
+                with metrics.span("apply"):
+                    _apply_result(jpeg, result, raw_frame)
 
-    cv2.imwrite("face_tracking/latest.jpg", processed_frame )
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            pending, self._pending = self._pending, None
+            self._cond.notify_all()
+        if pending is not None and pending[2] is not None:
+            pending[2]()
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+        current = threading.current_thread()
+        for t in (self._sender, self._receiver):
+            if t is not current:
+                t.join(timeout=2)
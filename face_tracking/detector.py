@@ -1,8 +1,11 @@
 import argparse
 import sys
 import time
-from picamera2 import Picamera2
-from libcamera import Transform
+try:
+    from picamera2 import Picamera2
+    from libcamera import Transform
+except ImportError:  # only needed by the camera demo below
+    Picamera2 = Transform = None
 
 import cv2
 import mediapipe as mp
@@ -0,0 +1,183 @@
+"""Detect-then-track: run the face detector now and then, follow the box with optical flow.
+
+FaceFollower.update(image) runs the MediaPipe FaceDetector when:
+- there is no box yet,
+- `detect_every` frames have passed since the last detection,
+- the last detection scored below `min_confidence`,
+- or the flow step reports drift.
+
+On the other frames, corners found inside the last box are followed with
+pyramidal Lucas-Kanade optical flow. The box moves by their median shift and
+scales by their median spread change. A point only counts if tracking it
+back to the previous frame lands within `max_fb_error` pixels
+(forward-backward check). Drift is declared when:
+- too few points survive,
+- the box changes scale too fast or leaves the frame,
+- or the box no longer looks like the face did at detection. This is a
+  normalized cross-correlation on a small template, and it catches points
+  that stay on the static background while the face moves away.
+
+A flow frame costs about 2 ms including the grey conversion, because flow
+only runs on a region around the box. A detector pass costs several times
+that on the Pi, and only one frame in `detect_every` pays for it while the
+face is followed.
+"""
+import cv2
+import numpy as np
+
+from backend.metrics import metrics
+
+TEMPLATE_SIZE = (24, 24)
+FLOW_MARGIN = 0.5   # 光流的搜尋範圍：框的四周各加上框邊長的這個比例
+LK_PARAMS = dict(winSize=(11, 11), maxLevel=2,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+
+class FaceFollower:
+    def __init__(self, detector, detect_every=10, min_confidence=0.6, max_points=30,
+                 min_points=8, max_fb_error=1.5, max_scale_step=0.15, min_similarity=0.5):
+        self.detector = detector
+        self.detect_every = max(1, detect_every)
+        self.min_confidence = min_confidence
+        self.max_points = max_points
+        self.min_points = min_points
+        self.max_fb_error = max_fb_error
+        self.max_scale_step = max_scale_step
+        self.min_similarity = min_similarity
+
+        self.box = None             # (x1, y1, x2, y2), float
+        self.confidence = 0.0       # detector score of the last detection
+        self._points = None
+        self._template = None       # 偵測當下臉的小灰階圖，用來檢查有沒有跟丟
+        self._prev_gray = None
+        self._since_detect = 0
+
+        self.detections = 0         # detector calls
+        self.tracked = 0            # frames served by optical flow
+        self.redetects = 0          # detections forced by drift / low confidence
+
+    def reset(self):
+        self.box = self._points = self._template = self._prev_gray = None
+
+    def _needs_detection(self):
+        # _since_detect 已經把這一幀算進去，detect_every=1 就是每幀偵測
+        return (self.box is None or self._points is None
+                or self._since_detect >= self.detect_every
+                or self.confidence < self.min_confidence)
+
+    def _detect(self, image, gray):
+        self.detections += 1
+        self._since_detect = 0
+        with metrics.span("face_detect"):
+            result = self.detector.detect(image)
+        if not result.detections:
+            self.box = self._points = None
+            self.confidence = 0.0
+            return
+        detection = result.detections[0]    # defaults to the first detected face
+        bbox = detection.bounding_box
+        categories = getattr(detection, "categories", None)
+        self.confidence = categories[0].score if categories else 1.0
+        self.box = (float(bbox.origin_x), float(bbox.origin_y),
+                    float(bbox.origin_x + bbox.width), float(bbox.origin_y + bbox.height))
+        self._points = self._seed_points(gray, self.box)
+        self._template = self._patch(gray, self.box)
+
+    @staticmethod
+    def _clip(gray, box):
+        h, w = gray.shape
+        x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+        x2, y2 = min(w, int(box[2])), min(h, int(box[3]))
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+        return x1, y1, x2, y2
+
+    def _patch(self, gray, box):
+        clipped = self._clip(gray, box)
+        if clipped is None:
+            return None
+        x1, y1, x2, y2 = clipped
+        return cv2.resize(gray[y1:y2, x1:x2], TEMPLATE_SIZE, interpolation=cv2.INTER_AREA)
+
+    def _seed_points(self, gray, box):
+        clipped = self._clip(gray, box)
+        if clipped is None:
+            return None
+        x1, y1, x2, y2 = clipped
+        # 只在框裡找角點，比整張圖加 mask 快很多
+        points = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], self.max_points, qualityLevel=0.01, minDistance=5)
+        if points is None or len(points) < self.min_points:
+            return None
+        return points + np.array([x1, y1], np.float32)
+
+    def _similar(self, gray, box):
+        patch = self._patch(gray, box)
+        if patch is None or self._template is None:
+            return False
+        score = cv2.matchTemplate(patch, self._template, cv2.TM_CCOEFF_NORMED)[0, 0]
+        return score >= self.min_similarity
+
+    def _flow(self, gray):
+        """Move the box with the points; False when the track has drifted."""
+        # 只在框附近算光流：金字塔不用整張圖建
+        x1, y1, x2, y2 = self.box
+        margin = max(x2 - x1, y2 - y1) * FLOW_MARGIN + 16
+        roi = self._clip(gray, (x1 - margin, y1 - margin, x2 + margin, y2 + margin))
+        if roi is None:
+            return False
+        rx1, ry1, rx2, ry2 = roi
+        offset = np.array([rx1, ry1], np.float32)
+        prev = self._points - offset
+        prev_roi, cur_roi = self._prev_gray[ry1:ry2, rx1:rx2], gray[ry1:ry2, rx1:rx2]
+        with metrics.span("face_flow"):
+            nxt, status, _ = cv2.calcOpticalFlowPyrLK(prev_roi, cur_roi, prev, None, **LK_PARAMS)
+            back, status_back, _ = cv2.calcOpticalFlowPyrLK(cur_roi, prev_roi, nxt, None, **LK_PARAMS)
+        fb_error = np.linalg.norm((prev - back).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (status_back.ravel() == 1) & (fb_error < self.max_fb_error)
+        if good.sum() < self.min_points:
+            return False
+
+        p0, p1 = prev.reshape(-1, 2)[good] + offset, nxt.reshape(-1, 2)[good] + offset
+        dx, dy = np.median(p1 - p0, axis=0)
+        # 點到中心距離的比例 = 縮放
+        d0 = np.linalg.norm(p0 - p0.mean(axis=0), axis=1)
+        d1 = np.linalg.norm(p1 - p1.mean(axis=0), axis=1)
+        valid = d0 > 1.0
+        scale = float(np.median(d1[valid] / d0[valid])) if valid.any() else 1.0
+        if abs(scale - 1.0) > self.max_scale_step:
+            return False
+
+        x1, y1, x2, y2 = self.box
+        cx, cy = (x1 + x2) / 2 + dx, (y1 + y2) / 2 + dy
+        hw, hh = (x2 - x1) / 2 * scale, (y2 - y1) / 2 * scale
+        h, w = gray.shape
+        if cx < 0 or cy < 0 or cx >= w or cy >= h:
+            return False
+        box = (cx - hw, cy - hh, cx + hw, cy + hh)
+        if not self._similar(gray, box):
+            return False
+        self.box = box
+        self._points = p1.reshape(-1, 1, 2)
+        return True
+
+    def update(self, image):
+        """Face box (x1, y1, x2, y2) in `image` (RGB), or None when there is no face."""
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        self._since_detect += 1
+        if self._needs_detection():
+            if self.box is not None and self._since_detect < self.detect_every:
+                # 還沒到時間就重新偵測：信心太低或點太少
+                self.redetects += 1
+            self._detect(image, gray)
+        elif self._flow(gray):
+            self.tracked += 1
+            # 點慢慢流失時在目前的框裡補點
+            if len(self._points) < self.min_points * 2:
+                self._points = self._seed_points(gray, self.box)
+        else:
+            self.redetects += 1
+            self._detect(image, gray)
+        self._prev_gray = gray
+        if self.box is None:
+            return None
+        return tuple(int(round(v)) for v in self.box)
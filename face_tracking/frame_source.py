@@ -0,0 +1,159 @@
+"""Frame sources with the Picamera2 `capture_array()` interface.
+
+tracker_task only calls `capture_array()`, so a recorded video or a folder
+of images can stand in for the camera (bench/replay.py, development without
+a Pi). Frames are BGR uint8 arrays like the camera's "RGB888" format.
+
+`capture_into(out)` fills a buffer from a previous frame instead of
+allocating a new one where the source allows it (video files, the camera),
+which is what face_tracking/capture.py uses for its ring of buffers.
+"""
+import os
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class EndOfStream(Exception):
+    pass
+
+
+class FrameSource:
+    """Base class: subclasses implement `_read(out)` returning a frame or None at the end.
+
+    `_read` may fill `out` (same shape as the frames it returns) or ignore it.
+    """
+
+    def __init__(self, loop=False, fps=None, size=None):
+        self.loop = loop
+        self.fps = fps          # None: as fast as possible, otherwise pace capture_array()
+        self.size = size        # (width, height) to resize to, None keeps the original
+        self.frames = 0
+        self._next_at = None
+
+    def _read(self, out=None):
+        raise NotImplementedError
+
+    def _rewind(self):
+        raise NotImplementedError
+
+    def capture_array(self):
+        return self.capture_into(None)
+
+    def capture_into(self, out):
+        """Next frame, written into `out` when possible; returns the frame (maybe not `out`)."""
+        resize = self.size is not None
+        frame = self._read(None if resize else out)
+        if frame is None and self.loop and self.frames:
+            self._rewind()
+            frame = self._read(None if resize else out)
+        if frame is None:
+            raise EndOfStream
+        if resize and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+            fits = out is not None and out.shape == (self.size[1], self.size[0]) + frame.shape[2:]
+            frame = cv2.resize(frame, tuple(self.size), dst=out if fits else None)
+        if self.fps:
+            now = time.perf_counter()
+            if self._next_at is not None and self._next_at > now:
+                time.sleep(self._next_at - now)
+            self._next_at = max(now, self._next_at or now) + 1.0 / self.fps
+        self.frames += 1
+        return frame
+
+    def __iter__(self):
+        while True:
+            try:
+                yield self.capture_array()
+            except EndOfStream:
+                return
+
+    def close(self):
+        pass
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise FileNotFoundError(f"cannot open video {path}")
+
+    def _read(self, out=None):
+        # 尺寸相同時 OpenCV 直接寫進 out
+        ok, frame = self.cap.read(out) if out is not None else self.cap.read()
+        return frame if ok else None
+
+    def _rewind(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def close(self):
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.paths:
+            raise FileNotFoundError(f"no images in {path}")
+        self._index = 0
+
+    def _read(self, out=None):
+        while self._index < len(self.paths):
+            frame = cv2.imread(self.paths[self._index])
+            self._index += 1
+            if frame is not None:
+                return frame
+        return None
+
+    def _rewind(self):
+        self._index = 0
+
+
+class PicameraSource(FrameSource):
+    """The real camera, same settings as app.py; `camera` wraps an already started Picamera2."""
+
+    def __init__(self, size=(800, 600), camera=None, **kwargs):
+        super().__init__(**kwargs)
+        self.owns_camera = camera is None
+        if camera is None:
+            from picamera2 import Picamera2
+            camera = Picamera2()
+            config = camera.create_preview_configuration(main={"format": "RGB888", "size": tuple(size)})
+            camera.configure(config)
+            camera.start()
+        self.camera = camera
+
+    def _read(self, out=None):
+        if out is None:
+            return self.camera.capture_array()
+        from picamera2 import MappedArray
+        # 從相機的 buffer 直接複製到 out，不另外配置記憶體
+        request = self.camera.capture_request()
+        try:
+            with MappedArray(request, "main") as mapped:
+                src = mapped.array
+                if src.shape[0] < out.shape[0] or src.shape[1] < out.shape[1]:
+                    return src.copy()
+                np.copyto(out, src[:out.shape[0], :out.shape[1], :out.shape[2]])
+        finally:
+            request.release()
+        return out
+
+    def close(self):
+        if self.owns_camera:
+            self.camera.stop()
+
+
+def open_source(spec, **kwargs):
+    """"picamera", a directory of images, or a video file."""
+    if spec == "picamera":
+        return PicameraSource(**kwargs)
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, **kwargs)
+    return VideoFileSource(spec, **kwargs)
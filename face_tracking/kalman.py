@@ -0,0 +1,135 @@
+"""Constant-velocity Kalman filter for the face position, with latency compensation.
+
+ConstantVelocityKalman keeps the state [x, y, vx, vy] (pixels, pixels/s) and
+its covariance in NumPy arrays. The motion model is white-noise
+acceleration, and measurements are face-box centres.
+
+FacePredictor wraps the filter for FaceTracker:
+- Latency: each update gets the frame's capture time. The time from
+  capture to the servo command is measured at every actuation (EWMA), and
+  the position handed to the PID is extrapolated by that much. The
+  controller then aims where the face will be, not where it was.
+- Gaps: frames without a detection only run `predict`. The face coasts
+  along its velocity for up to `max_coast` seconds; after that the filter
+  resets and the servos hold still.
+- Camera motion: when the servos move, the camera's view shifts. The state
+  is shifted by the same amount of pixels, and so is every later
+  measurement from a frame captured before that move. The servos' own
+  motion is therefore not mistaken for face velocity.
+"""
+from collections import deque
+
+import numpy as np
+
+_H = np.array([[1.0, 0.0, 0.0, 0.0],
+               [0.0, 1.0, 0.0, 0.0]])
+
+
+class ConstantVelocityKalman:
+    def __init__(self, accel_std=600.0, measurement_std=4.0, initial_velocity_std=200.0):
+        self.q = accel_std ** 2
+        self.R = np.eye(2) * measurement_std ** 2
+        self.initial_velocity_var = initial_velocity_std ** 2
+        self.x = np.zeros(4)
+        self.P = np.eye(4)
+        self._F = np.eye(4)
+        self._Q = np.zeros((4, 4))
+        self.initialized = False
+
+    def reset(self):
+        self.initialized = False
+
+    def init(self, z):
+        self.x[:] = (z[0], z[1], 0.0, 0.0)
+        self.P[:] = np.diag([self.R[0, 0], self.R[1, 1], self.initial_velocity_var, self.initial_velocity_var])
+        self.initialized = True
+
+    def predict(self, dt):
+        if dt <= 0:
+            return
+        F, Q = self._F, self._Q
+        F[0, 2] = F[1, 3] = dt
+        dt2, dt3, dt4 = dt * dt, dt ** 3 / 2, dt ** 4 / 4
+        Q[0, 0] = Q[1, 1] = dt4 * self.q
+        Q[0, 2] = Q[2, 0] = Q[1, 3] = Q[3, 1] = dt3 * self.q
+        Q[2, 2] = Q[3, 3] = dt2 * self.q
+        self.x = F @ self.x
+        self.P = F @ self.P @ F.T + Q
+
+    def update(self, z):
+        y = np.asarray(z, dtype=float) - _H @ self.x
+        S = _H @ self.P @ _H.T + self.R
+        K = self.P @ _H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(4) - K @ _H) @ self.P
+
+    def shift(self, dx, dy):
+        self.x[0] += dx
+        self.x[1] += dy
+
+    def position(self, ahead=0.0):
+        return self.x[:2] + self.x[2:] * ahead
+
+
+class FacePredictor:
+    def __init__(self, kalman=None, max_coast=0.5, latency_alpha=0.2, max_horizon=0.3):
+        self.kalman = kalman or ConstantVelocityKalman()
+        self.max_coast = max_coast
+        self.latency_alpha = latency_alpha
+        self.max_horizon = max_horizon      # 預測不超過這麼遠，延遲量測異常時也不會亂跑
+        self.latency = 0.0                  # capture -> 伺服馬達指令 (秒)
+        self._last_t = None
+        self._last_seen = None
+        self._moves = deque()               # (actuation time, dx, dy)
+
+    def _shift_since(self, t):
+        dx = dy = 0.0
+        for when, mx, my in self._moves:
+            if when > t:
+                dx += mx
+                dy += my
+        return dx, dy
+
+    def update(self, center, timestamp):
+        """Feed one frame (face centre or None) captured at `timestamp`.
+
+        Returns the predicted (x, y) at actuation time, or None when there is
+        nothing to aim at (no face yet, or coasted for too long).
+        """
+        kf = self.kalman
+        if center is not None:
+            dx, dy = self._shift_since(timestamp)
+            center = (center[0] + dx, center[1] + dy)
+        if not kf.initialized:
+            if center is None:
+                return None
+            kf.init(center)
+            self._last_t = self._last_seen = timestamp
+            return tuple(kf.position())
+
+        if timestamp > self._last_t:
+            kf.predict(timestamp - self._last_t)
+            self._last_t = timestamp
+        if center is not None:
+            kf.update(center)
+            self._last_seen = timestamp
+        elif timestamp - self._last_seen > self.max_coast:
+            kf.reset()
+            return None
+        return tuple(kf.position(min(self.latency, self.max_horizon)))
+
+    def actuated(self, captured_at, now, dx=0.0, dy=0.0):
+        """The servos were commanded at `now` for a frame captured at `captured_at`.
+
+        (dx, dy): how far that move shifts the face in the image, in pixels.
+        """
+        sample = max(0.0, now - captured_at)
+        self.latency += self.latency_alpha * (sample - self.latency)
+        if dx or dy:
+            if self.kalman.initialized:
+                self.kalman.shift(dx, dy)
+            self._moves.append((now, dx, dy))
+        # 只需要留著比最舊的在途 frame 還新的移動
+        while self._moves and now - self._moves[0][0] > 2.0:
+            self._moves.popleft()
+
@@ -0,0 +1,60 @@
+"""In-memory, versioned "latest photo" slot.
+
+The tracker thread publishes every new result here instead of writing
+face_tracking/latest.jpg, and Flask serves /latest_photo and /stream from it.
+A result is either a ready JPEG (full-frame replies) or a render callable
+(metadata-only replies), which is run at most once per version and only when
+somebody actually reads the slot.
+"""
+import threading
+import time
+
+
+class LatestFrame:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._version = 0
+        self._jpeg = None
+        self._render = None
+        # identifies this process in ETags, so a restart never matches an old one
+        self.boot_id = format(int(time.time() * 1000) & 0xFFFFFFFF, "x")
+
+    def publish(self, jpeg=None, render=None):
+        """Store a new frame: JPEG bytes, or a callable returning JPEG bytes."""
+        with self._cond:
+            self._version += 1
+            self._jpeg = jpeg
+            self._render = None if jpeg is not None else render
+            self._cond.notify_all()
+
+    @property
+    def version(self):
+        return self._version
+
+    def etag(self, version):
+        return f'"{self.boot_id}-{version}"'
+
+    def get(self):
+        """Returns (version, JPEG bytes or None)."""
+        with self._cond:
+            version, jpeg, render = self._version, self._jpeg, self._render
+        if jpeg is None and render is not None:
+            # 在鎖外畫，避免卡住 publish
+            jpeg = render()
+            with self._cond:
+                if self._version == version:
+                    self._jpeg, self._render = jpeg, None
+        return version, jpeg
+
+    def wait_newer(self, version, timeout=None):
+        """Block until the slot holds something newer than `version`.
+
+        Returns (version, JPEG) or None on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._version != version, timeout):
+                return None
+        return self.get()
+
+
+latest_frame = LatestFrame()
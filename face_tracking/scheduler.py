@@ -0,0 +1,129 @@
+"""Dual-rate device loop: servo tracking at camera rate, analysis uplink at its own rate.
+
+Both loops read the same FrameCapture through their own FrameReader:
+
+    servo   every new camera frame -> FaceTracker.track -> servos
+    uplink  newest frame at an adaptive rate -> PipelinedClient.submit
+
+The uplink rate follows the backend (AdaptiveRate): it creeps up while
+replies keep up and backs off when frames are replaced before they could be
+sent. All timestamps come from the capture's Clock (capture time, loop
+periods, frame age at use) and are recorded in metrics: servo_period /
+uplink_period and servo_frame_age / uplink_frame_age on /metrics.
+
+`run(stop_event)` returns once stop_event is set or either loop ends (source
+exhausted, error); both threads are joined before it returns.
+"""
+import threading
+
+import cv2
+
+from backend.metrics import metrics
+from face_tracking.frame_source import EndOfStream
+
+
+class AdaptiveRate:
+    """Additive increase / multiplicative decrease of a frame rate.
+
+    `update(replied, dropped)` with the number of replies and of dropped
+    (never sent) frames since the last call.
+    """
+
+    def __init__(self, min_fps=1.0, max_fps=10.0, start_fps=None, step=0.25, backoff=0.7):
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.fps = start_fps or max_fps
+        self.step = step
+        self.backoff = backoff
+
+    def update(self, replied, dropped):
+        if dropped:
+            self.fps *= self.backoff
+        elif replied:
+            self.fps += self.step * replied
+        self.fps = max(self.min_fps, min(self.max_fps, self.fps))
+        return self.fps
+
+
+class DualRateScheduler:
+    def __init__(self, capture, tracker, client, servo_fps=None, uplink=None,
+                 face_box_max_age=0.2):
+        self.capture = capture
+        self.tracker = tracker
+        self.client = client
+        self.clock = capture.clock
+        self.servo_reader = capture.reader(max_fps=servo_fps)    # None: every camera frame
+        self.uplink_rate = uplink or AdaptiveRate()
+        self.uplink_reader = capture.reader(max_fps=self.uplink_rate.fps)
+        # crop 模式用的臉框太舊就不用 (servo loop 落後時)
+        self.face_box_max_age = face_box_max_age
+        self._face = (None, 0.0)    # (face box, capture time of its frame)
+        self._done = threading.Event()
+        self.servo_frames = 0
+        self.uplink_frames = 0
+
+    def _should_stop(self, stop_event):
+        return stop_event.is_set() or self._done.is_set()
+
+    def _loop(self, name, stop_event, step):
+        last = None
+        try:
+            while not self._should_stop(stop_event):
+                if not step():
+                    continue
+                now = self.clock()
+                if last is not None:
+                    metrics.observe(f"{name}_period", now - last)
+                last = now
+        except EndOfStream:
+            print("Frame source exhausted")
+        except Exception as e:
+            print(f"Exception in {name} loop:", e)
+        finally:
+            # 一邊停了另一邊也停
+            self._done.set()
+
+    def _servo_step(self):
+        frame = self.servo_reader.read(timeout=0.5)
+        if frame is None:
+            return False
+        with frame:
+            metrics.observe("servo_frame_age", self.clock() - frame.timestamp)
+            with metrics.span("track"):
+                self.tracker.track(cv2.cvtColor(frame.array, cv2.COLOR_BGR2RGB), frame.timestamp)
+            self._face = (self.tracker.face_box, frame.timestamp)
+        self.servo_frames += 1
+        return True
+
+    def _uplink_step(self):
+        frame = self.uplink_reader.read(timeout=0.5)
+        if frame is None:
+            return False
+        metrics.observe("uplink_frame_age", self.clock() - frame.timestamp)
+        face_box, seen_at = self._face
+        if face_box is not None and abs(frame.timestamp - seen_at) > self.face_box_max_age:
+            face_box = None
+        replied, dropped = self.client.received, self.client.dropped
+        # the client releases the capture buffer once the frame is encoded
+        self.client.submit(frame.array, face_box, release=frame.release)
+        self.uplink_frames += 1
+        fps = self.uplink_rate.update(replied - self._replied, dropped - self._dropped)
+        self._replied, self._dropped = replied, dropped
+        self.uplink_reader.max_fps = fps
+        return True
+
+    def run(self, stop_event):
+        self._replied, self._dropped = self.client.received, self.client.dropped
+        threads = [threading.Thread(target=self._loop, args=("servo", stop_event, self._servo_step),
+                                    name="servo-loop", daemon=True),
+                   threading.Thread(target=self._loop, args=("uplink", stop_event, self._uplink_step),
+                                    name="uplink-loop", daemon=True)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def report(self):
+        return (f"servo={self.servo_frames} (skipped {self.servo_reader.skipped}) "
+                f"uplink={self.uplink_frames} at {self.uplink_rate.fps:.1f} fps "
+                f"(skipped {self.uplink_reader.skipped})")
@@ -0,0 +1,22 @@
+"""Numeric codes of the FocusAnalyzer status strings.
+
+Telemetry stores the code of every frame next to the status string
+(face_tracking/telemetry.py), and session_stats.py works on the codes.
+"""
+FOCUSED, PHONE, SLEEPING, HEAD_DOWN, LOOKING_AWAY, ABSENT, OTHER = range(7)
+STATE_NAMES = ("focused", "phone", "sleeping", "head_down", "looking_away", "absent", "other")
+
+# FocusAnalyzer status strings; "Init" / "Calibrating i/N" fall into OTHER
+STATUS_CODES = {
+    "Focused!": FOCUSED,
+    "NO PHONE!": PHONE,
+    "Sleeping zZz": SLEEPING,
+    "Head Down": HEAD_DOWN,
+    "Look RIGHT ->": LOOKING_AWAY,
+    "<- Look LEFT": LOOKING_AWAY,
+    "Absent": ABSENT,
+}
+
+
+def status_code(status):
+    return STATUS_CODES.get(status, OTHER)
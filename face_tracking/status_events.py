@@ -0,0 +1,59 @@
+"""Change notifications for tracker status, focus score and button state.
+
+Writers call `status_bus.update(...)`; the version only moves when a value
+actually changes. Readers (the /events SSE stream and /events/poll long-poll
+in app.py) block on a condition variable until the version moves, so an idle
+subscriber costs a parked thread and no CPU. Readers always get the newest
+snapshot, so intermediate changes are coalesced for free when a reader is
+rate limited.
+
+The version restarts at 0 with the process, so readers see it as an event id
+"<boot id>-<version>" (`event_id` / `parse_event_id`): an id from before a
+restart never matches, and the reader gets the current state right away.
+"""
+import threading
+import time
+
+
+class StatusBus:
+    def __init__(self, **initial):
+        self._cond = threading.Condition()
+        self._version = 0
+        self._state = dict(initial)
+        # 每次開機不同，重開後舊的 event id 不會剛好等於新的版本
+        self.boot_id = format(int(time.time() * 1000) & 0xFFFFFFFF, "x")
+
+    def update(self, **fields):
+        with self._cond:
+            changed = {k: v for k, v in fields.items() if self._state.get(k, object()) != v}
+            if not changed:
+                return self._version
+            self._state.update(changed)
+            self._version += 1
+            self._cond.notify_all()
+            return self._version
+
+    def snapshot(self):
+        """Returns (version, state dict copy)."""
+        with self._cond:
+            return self._version, dict(self._state)
+
+    def event_id(self, version):
+        return f"{self.boot_id}-{version}"
+
+    def parse_event_id(self, event_id):
+        """Event id -> version; -1 (newer than nothing) if malformed or from another boot."""
+        boot_id, _, version = (event_id or "").rpartition("-")
+        if boot_id != self.boot_id or not version.isdigit():
+            return -1
+        return int(version)
+
+    def wait_newer(self, version, timeout=None):
+        """Block until the version differs from `version`; None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._version != version, timeout):
+                return None
+            return self._version, dict(self._state)
+
+
+status_bus = StatusBus(tracker_status="Not Running!", score=None, button_status=0)
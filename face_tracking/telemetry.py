@@ -0,0 +1,163 @@
+"""Write-behind per-frame focus telemetry.
+
+The tracker thread calls `telemetry.record(...)` for every analysed frame; it
+only appends to a bounded in-memory buffer. A flusher thread (one per
+session) hands the rows to `sink(rows)` in batches, either when `batch_size`
+rows are waiting or every `flush_interval` seconds, so a slow database never
+stalls the frame loop. If the sink falls behind and the buffer fills, the
+oldest unflushed rows are dropped (and counted). A failed batch goes back to
+the front of the buffer and is retried with the same row dicts (the sink may
+have tagged them, e.g. Mongo's _id). `stop()` retries the final flush a few
+times and reports how many rows it could not write.
+
+Per-session aggregates are kept separately from the buffer, so the session
+summary returned by `stop()` is exact even if rows were dropped.
+"""
+import threading
+import time
+from collections import deque
+
+from face_tracking.status_codes import status_code
+
+FOCUSED_STATUS = "Focused!"
+
+
+class TelemetryBuffer:
+    def __init__(self, max_buffer=20000, batch_size=200, flush_interval=2.0,
+                 stop_retries=3, stop_retry_delay=0.5):
+        self.max_buffer = max_buffer
+        self.stop_retries = stop_retries
+        self.stop_retry_delay = stop_retry_delay
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        self._rows = deque(maxlen=max_buffer)
+        self._sink = None
+        self._tags = None
+        self._thread = None
+        self._stopping = False
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.frames = 0
+        self.score_sum = 0.0
+        self.focused = 0
+        self.phone = 0
+        self.first_ts = self.last_ts = None
+        self.flushed = 0
+        self.dropped = 0
+        self.unwritten = 0      # 結束時重試後仍沒寫進去的
+
+    @property
+    def active(self):
+        return self._tags is not None
+
+    def start(self, sink, **tags):
+        """Begin a session. `tags` (e.g. session_id, username) are added to every row."""
+        self.stop()
+        with self._cond:
+            self._reset_counters()
+            self._rows.clear()
+            self._sink = sink
+            self._tags = tags
+            self._stopping = False
+        self._thread = threading.Thread(target=self._flush_loop, name="telemetry-flush", daemon=True)
+        self._thread.start()
+
+    def record(self, score, status, phone=False, ts=None):
+        """Never blocks on I/O; a no-op when no session is running."""
+        ts = time.time() if ts is None else ts
+        with self._cond:
+            if self._tags is None:
+                return
+            if len(self._rows) == self.max_buffer:
+                self.dropped += 1
+            self._rows.append({**self._tags, "ts": ts, "score": float(score),
+                               "status": status, "state": status_code(status),
+                               "phone": bool(phone)})
+            self.frames += 1
+            self.score_sum += score
+            self.focused += status == FOCUSED_STATUS
+            self.phone += bool(phone)
+            if self.first_ts is None:
+                self.first_ts = ts
+            self.last_ts = ts
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+
+    def _take_batch(self):
+        batch = list(self._rows)
+        self._rows.clear()
+        return batch
+
+    def _write(self, batch):
+        try:
+            self._sink(batch)
+            self.flushed += len(batch)
+            return True
+        except Exception as e:
+            print(f"Telemetry flush failed ({len(batch)} rows): {e}")
+            with self._cond:
+                # 放回最前面，下次再試；buffer 滿了就丟最舊的
+                room = self.max_buffer - len(self._rows)
+                keep = batch[-room:] if room > 0 else []
+                self.dropped += len(batch) - len(keep)
+                self._rows.extendleft(reversed(keep))
+            return False
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or len(self._rows) >= self.batch_size, self.flush_interval)
+                stopping = self._stopping
+                batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            if stopping:
+                return
+
+    def summary(self):
+        frames = self.frames
+        return {
+            "frames": frames,
+            "mean_score": self.score_sum / frames if frames else 0.0,
+            "focused_ratio": self.focused / frames if frames else 0.0,
+            "phone_frames": self.phone,
+            "duration_s": (self.last_ts - self.first_ts) if frames else 0.0,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "unwritten": self.unwritten,
+            # 本次 session 的分數：平均專注分數 (0~100)
+            "session_score": round(self.score_sum / frames) if frames else 0,
+        }
+
+    def stop(self):
+        """End the session: one final flush, then return the summary (None if not running)."""
+        with self._cond:
+            if self._tags is None:
+                return None
+            self._tags = None
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+        # 之後沒有 flusher 了：沒寫成功的在這裡重試幾次，還是不行就回報
+        delay = self.stop_retry_delay
+        for attempt in range(self.stop_retries):
+            with self._cond:
+                batch = self._take_batch()
+            if not batch or self._write(batch):
+                break
+            if attempt + 1 < self.stop_retries:
+                time.sleep(delay)
+                delay *= 2
+        with self._cond:
+            self.unwritten = len(self._rows)
+            self._rows.clear()
+        if self.unwritten:
+            print(f"Telemetry: {self.unwritten} rows could not be written at session end")
+        return self.summary()
+
+
+telemetry = TelemetryBuffer()
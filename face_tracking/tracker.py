@@ -1,19 +1,59 @@
 import time
-import RPi.GPIO as GPIO
-from face_tracking.utils import angle_to_duty_cycle, angle_to_gpiozero_value, setup_servo, setup_servo_gpiozero
+from face_tracking.utils import (GPIO, angle_to_duty_cycle, angle_to_gpiozero_value, setup_mock_servo,
+                                 setup_servo, setup_servo_gpiozero)
 from face_tracking.detector import FaceDetector
 from face_tracking.controller import PIDController
+from face_tracking.face_follower import FaceFollower
+from face_tracking.kalman import FacePredictor
 import cv2
-from picamera2 import Picamera2
+try:
+    from picamera2 import Picamera2
+except ImportError:  # replay / development without a camera, see face_tracking/frame_source.py
+    Picamera2 = None
 import asyncio
 import os
 import websocket
-from face_tracking.client import Client
+from face_tracking.capture import FrameCapture
+from face_tracking.client import PipelinedClient
+from face_tracking.frame_source import FrameSource, PicameraSource
+from face_tracking.scheduler import AdaptiveRate, DualRateScheduler
+
+# Max frames awaiting a backend reply before newer frames start replacing unsent ones
+UPLINK_WINDOW = 2
+# 伺服馬達追蹤跑在相機的幀率 (None)，上傳給 backend 的頻率在這個範圍內自動調整
+SERVO_FPS = None
+UPLINK_MIN_FPS = 1.0
+UPLINK_MAX_FPS = 10.0
+CAPTURE_BUFFERS = 3
+# "hybrid": FaceDetector every DETECT_EVERY frames (or on drift / low confidence), optical flow in between
+# "detect": FaceDetector on every frame
+FACE_MODE = "hybrid"
+DETECT_EVERY = 10
+# "kalman": constant-velocity Kalman filter, aims where the face will be when the servos move
+# "window": average of the last 5 face centres (the old behaviour)
+SMOOTHING = "kalman"
+SERVO_DEADBAND_DEG = 0.3   # 小於這個角度的修正不送給伺服馬達，避免抖動
+# 相機視角 (Pi Camera Module v2)，換算伺服馬達轉動會讓畫面移動幾個 pixel
+CAMERA_HFOV_DEG = 62.2
+CAMERA_VFOV_DEG = 48.8
+# 每一幀印出臉的位置 (除錯用；servo loop 跟著相機跑，約每秒 30 行)
+LOG_FACE = False
 
 
 class FaceTracker:
-    def __init__(self):
-        self.pan_pwm, self.tilt_pwm = setup_servo()
+    def __init__(self, pwms=None, mode=FACE_MODE, detect_every=DETECT_EVERY, smoothing=SMOOTHING,
+                 deadband=SERVO_DEADBAND_DEG, clock=time.monotonic):
+        # pwms: (pan, tilt) PWM objects, e.g. setup_mock_servo() for replay
+        # clock: time base of the capture timestamps passed to track()
+        self.clock = clock
+        self.deadband = deadband
+        if pwms is None:
+            if GPIO is None:
+                print("RPi.GPIO not available, using mock servos")
+                pwms = setup_mock_servo()
+            else:
+                pwms = setup_servo()
+        self.pan_pwm, self.tilt_pwm = pwms
         self.pan_angle = 90  # Initial angle
         self.tilt_angle = 70  # Initial angle
         self.move_to(self.pan_angle, self.tilt_angle)
@@ -31,8 +71,11 @@ class FaceTracker:
             frame_width=640,
             frame_height=480
         )
+        self.follower = FaceFollower(self.detector, detect_every=detect_every) if mode == "hybrid" else None
         self.controller = PIDController(kp=0.03, ki=0, kd=0)
         self.sliding_window = []
+        self.predictor = FacePredictor() if smoothing == "kalman" else None
+        self.face_box = None  # (x1, y1, x2, y2) of the last detection, None if no face
         
     def smooth_move(self, current, target, pwm, steps=20, delay=0.01):
         if current == target:
@@ -61,6 +104,10 @@ class FaceTracker:
     def move_to(self, target_pan, target_tilt):
         target_pan = max(0, min(180, target_pan))
         target_tilt = max(0, min(180, target_tilt))
+        if abs(target_pan - self.pan_angle) < self.deadband:
+            target_pan = self.pan_angle
+        if abs(target_tilt - self.tilt_angle) < self.deadband:
+            target_tilt = self.tilt_angle
         if target_pan != self.pan_angle:
             # self.pan_angle = self.smooth_move(self.pan_angle, target_pan, self.pan_pwm)
             self.pan_angle = self.move(self.pan_angle, target_pan, self.pan_pwm)
@@ -81,39 +128,84 @@ class FaceTracker:
                 self.tilt_pwm.stop()
             except Exception as e:
                 print("Failed to stop tilt_pwm:", e)
-        GPIO.cleanup()
+        if GPIO is not None:
+            GPIO.cleanup()
         
 
-    def track(self, image):
+    def locate(self, image):
+        """Face box (x1, y1, x2, y2) in the RGB `image`, or None."""
+        if self.follower is not None:
+            return self.follower.update(image)
         detection_result = self.detector.detect(image)
-        if detection_result.detections:
-            bbox = detection_result.detections[0].bounding_box # defaults to the first detected face
-            face_x = bbox.origin_x + bbox.width // 2
-            face_y = bbox.origin_y + bbox.height // 2
-            self.sliding_window.append((face_x, face_y))
-            if len(self.sliding_window) > 5:
-                self.sliding_window.pop(0)
-            face_x = sum([pos[0] for pos in self.sliding_window]) // len(self.sliding_window)
-            face_y = sum([pos[1] for pos in self.sliding_window]) // len(self.sliding_window)
-            print(f"face center: {face_x}, {face_y}")
+        if not detection_result.detections:
+            return None
+        bbox = detection_result.detections[0].bounding_box # defaults to the first detected face
+        return (bbox.origin_x, bbox.origin_y, bbox.origin_x + bbox.width, bbox.origin_y + bbox.height)
+
+    def track(self, image, captured_at=None):
+        """Find the face in the RGB `image` and move the servos.
+
+        `captured_at`: capture time of `image` on self.clock (default: now).
+        """
+        if captured_at is None:
+            captured_at = self.clock()
+        self.face_box = self.locate(image)
+        self.follow(self.face_box, captured_at, image.shape)
+
+    def follow(self, face_box, captured_at, frame_shape=None):
+        """Servo step for a located face box (or None)."""
+        center = None
+        if face_box is not None:
+            x1, y1, x2, y2 = face_box
+            center = (x1 + (x2 - x1) // 2, y1 + (y2 - y1) // 2)
+        if self.predictor is None:
+            face_x, face_y = self.smooth_window(center)
         else:
-            face_x = self.sliding_window[-1][0] if self.sliding_window else self.detector.frame_width // 2
-            face_y = self.sliding_window[-1][1] if self.sliding_window else self.detector.frame_height // 2
-            print("No face detected.")
+            predicted = self.predictor.update(center, captured_at)
+            if predicted is None:
+                # 沒有臉 (或 coast 太久)：伺服馬達不動
+                if LOG_FACE:
+                    print("No face detected.")
+                return
+            face_x, face_y = predicted
+            if LOG_FACE:
+                print(f"face center: {face_x:.0f}, {face_y:.0f}" if center is not None else "No face detected, coasting.")
+
         # Calculate target angles based on face position
         # target_pan = 90 + (center_x - self.detector.frame_width / 2) * (90 / (self.detector.frame_width / 2))
         # target_tilt = 90 - (center_y - self.detector.frame_height / 2) * (90 / (self.detector.frame_height / 2))
         # error_x = face_x - (self.detector.frame_width / 2)
         # error_y = face_y - (self.detector.frame_height / 2)
         output_x, output_y = self.controller.compute((self.detector.frame_width / 2, self.detector.frame_height / 2), (face_x, face_y))
-        
+        pan, tilt = self.pan_angle, self.tilt_angle
         # if abs(error_x) > 100 or abs(error_y) > 50:
         target_pan = self.pan_angle - output_x
         target_tilt = self.tilt_angle + output_y
         self.move_to(target_pan, target_tilt)
-        # Clamp angles to valid range
-        # target_pan = max(0, min(180, target_pan))
-        # target_tilt = max(0, min(180, target_tilt))
+        if self.predictor is not None:
+            # 轉 pan 變大時臉往左移，tilt 變大時臉往下移 (跟 controller 的方向一致)
+            h, w = frame_shape[:2] if frame_shape is not None else (self.detector.frame_height, self.detector.frame_width)
+            self.predictor.actuated(captured_at, self.clock(),
+                                    dx=-(self.pan_angle - pan) * w / CAMERA_HFOV_DEG,
+                                    dy=(self.tilt_angle - tilt) * h / CAMERA_VFOV_DEG)
+
+    def smooth_window(self, center):
+        """Average of the last 5 face centres; the last average when there is no face."""
+        if center is not None:
+            face_x, face_y = center
+            self.sliding_window.append((face_x, face_y))
+            if len(self.sliding_window) > 5:
+                self.sliding_window.pop(0)
+            face_x = sum([pos[0] for pos in self.sliding_window]) // len(self.sliding_window)
+            face_y = sum([pos[1] for pos in self.sliding_window]) // len(self.sliding_window)
+            if LOG_FACE:
+                print(f"face center: {face_x}, {face_y}")
+        else:
+            face_x = self.sliding_window[-1][0] if self.sliding_window else self.detector.frame_width // 2
+            face_y = self.sliding_window[-1][1] if self.sliding_window else self.detector.frame_height // 2
+            if LOG_FACE:
+                print("No face detected.")
+        return face_x, face_y
 
 if __name__ == '__main__':
     tracker = None
@@ -150,7 +242,7 @@ if __name__ == '__main__':
 
 
 def tracker_task(stop_event, picamera2):
-    """Thread loop, controlled by stop_event"""
+    """Thread loop, controlled by stop_event. `picamera2`: a started Picamera2 or a FrameSource."""
     tracker = FaceTracker()
     ws = websocket.WebSocket()
     ws.connect("ws://jasondemacbook.local:8765")
@@ -160,20 +252,25 @@ def tracker_task(stop_event, picamera2):
     #picamera2 = init_camera()
 
 
-    frame_count = 0
-    try:
-        while not stop_event.is_set():
-            frame = picamera2.capture_array()
-            frame_count += 1
-            if frame_count % 4 != 0:
-                continue
-            Client(frame, ws)
-            
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            tracker.track(frame_rgb)
-            
+    # sender / receiver threads; submit() never waits on the backend
+    client = PipelinedClient(ws, window=UPLINK_WINDOW)
 
+    # 相機在自己的 thread 一直抓；servo 與上傳各自一個 thread，以不同頻率拿最新的一張
+    source = picamera2 if isinstance(picamera2, FrameSource) else PicameraSource(camera=picamera2)
+    capture = FrameCapture(source, buffers=CAPTURE_BUFFERS).start()
+    # 延遲量測要跟 frame 的時間戳用同一個時鐘
+    tracker.clock = capture.clock
+    scheduler = DualRateScheduler(capture, tracker, client, servo_fps=SERVO_FPS,
+                                  uplink=AdaptiveRate(UPLINK_MIN_FPS, UPLINK_MAX_FPS))
+    try:
+        scheduler.run(stop_event)   # returns after both loops are joined
     except Exception as e:
         print("Exception in tracker_task:", e)
+    finally:
+        client.close()
+        capture.stop()
+        print(f"Loops: {scheduler.report()}, capture dropped={capture.dropped}")
+        print(f"Uplink: sent={client.sent} ({client.bytes_sent} bytes) received={client.received} "
+              f"dropped={client.dropped} stale={client.stale}")
 
     
\ No newline at end of file
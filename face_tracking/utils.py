@@ -7,8 +7,12 @@ import time
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 
-import RPi.GPIO as GPIO
-from gpiozero import Servo
+try:
+    import RPi.GPIO as GPIO
+    from gpiozero import Servo
+except ImportError:  # 不在 Pi 上（replay / 開發），用 MockPWM
+    GPIO = None
+    Servo = None
 
 MARGIN = 10  # pixels
 ROW_SIZE = 30  # pixels
@@ -80,6 +84,30 @@ def setup_servo():
     tilt_pwm.start(7.5)  # Neutral position
     return pan_pwm, tilt_pwm
 
+class MockPWM:
+    """Stand-in for RPi.GPIO.PWM that records the commands it receives."""
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.duty_cycle = None
+        self.commands = 0
+
+    def start(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.commands += 1
+
+    def stop(self):
+        pass
+
+def setup_mock_servo():
+    pan_pwm, tilt_pwm = MockPWM(PAN_PIN), MockPWM(TILT_PIN)
+    pan_pwm.start(7.5)
+    tilt_pwm.start(7.5)
+    return pan_pwm, tilt_pwm
+
 def setup_servo_gpiozero():
     servo_pan = Servo(PAN_PIN)
     servo_tilt = Servo(TILT_PIN)
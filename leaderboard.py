@@ -0,0 +1,84 @@
+"""In-process leaderboard kept in sync with users_collection.
+
+Entries live in one list sorted by (-score, username), so a rank lookup is a
+bisect (O(log n)) and a page is a slice. app.py loads it once at startup from
+the score index and then updates it from every score write, so /rank never
+sorts the collection again. Only writes that go through this process are
+seen; run `load()` again after editing scores elsewhere (e.g. reconcile).
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+
+class Leaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []      # sorted (-score, username)
+        self._scores = {}    # username -> score
+        self._version = 0
+        self.boot_id = format(int(time.time() * 1000) & 0xFFFFFFFF, "x")
+
+    def load(self, rows):
+        """Replace everything with (username, score) pairs."""
+        scores = {username: score or 0 for username, score in rows}
+        keys = sorted((-score, username) for username, score in scores.items())
+        with self._lock:
+            self._scores, self._keys = scores, keys
+            self._version += 1
+
+    def update(self, username, score):
+        score = score or 0
+        with self._lock:
+            old = self._scores.get(username)
+            if old == score:
+                return
+            if old is not None:
+                del self._keys[bisect_left(self._keys, (-old, username))]
+            insort(self._keys, (-score, username))
+            self._scores[username] = score
+            self._version += 1
+
+    @property
+    def version(self):
+        return self._version
+
+    def etag(self, version):
+        return f'"lb-{self.boot_id}-{version}"'
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, username):
+        return username in self._scores
+
+    def page(self, offset=0, limit=None):
+        """Returns (version, [{"username", "score"}, ...]) ordered by score, highest first."""
+        with self._lock:
+            end = None if limit is None else offset + limit
+            keys = self._keys[offset:end]
+            version = self._version
+        return version, [{"username": name, "score": -neg} for neg, name in keys]
+
+    def rank(self, username, neighbors=2):
+        """Position of `username` (1 = top) and up to `neighbors` entries either side."""
+        with self._lock:
+            score = self._scores.get(username)
+            if score is None:
+                return None
+            index = bisect_left(self._keys, (-score, username))
+            lo = max(0, index - neighbors)
+            around = self._keys[lo:index + neighbors + 1]
+            total, version = len(self._keys), self._version
+        return {
+            "username": username,
+            "score": score,
+            "rank": index + 1,
+            "total": total,
+            "version": version,
+            "neighbors": [{"rank": lo + i + 1, "username": name, "score": -neg}
+                          for i, (neg, name) in enumerate(around)],
+        }
+
+
+leaderboard = Leaderboard()
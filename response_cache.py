@@ -0,0 +1,107 @@
+"""LRU + TTL cache for read-only JSON endpoints, with per-scope data versions.
+
+A cached response is tied to the versions of the scopes it was built from
+(e.g. "user:Allen", "users"). Write paths call `bump(...)` for the scopes they
+change, which invalidates exactly the dependent entries without scanning the
+cache. The TTL bounds staleness for writes this process never sees (another
+process writing to the same database). ETags are a hash of the body, so they
+are strong and survive restarts.
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import Response, current_app, request
+
+CachedResponse = namedtuple("CachedResponse", ["versions", "expires", "etag", "body", "status", "headers"])
+
+# 快取時一起保留的 header
+KEPT_HEADERS = ("Content-Type", "X-Total-Count")
+
+
+class ResponseCache:
+    def __init__(self, max_entries=512, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self.hits = self.misses = self.not_modified = self.evictions = 0
+
+    def versions(self, scopes):
+        with self._lock:
+            return tuple(self._versions.get(scope, 0) for scope in scopes)
+
+    def bump(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def get(self, key, versions):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.versions != versions or entry.expires < time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, versions, body, status, headers):
+        entry = CachedResponse(versions, time.monotonic() + self.ttl,
+                               f'"{hashlib.sha1(body).hexdigest()}"', body, status, headers)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+            }
+
+    def cached(self, scopes):
+        """Decorator for a Flask view. `scopes(**view_args)` names the data it reads.
+
+        Only 200 responses are cached. Every response gets an ETag, and a
+        matching If-None-Match gets 304.
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(**kwargs):
+                key = (request.path, tuple(sorted(request.args.items(multi=True))))
+                versions = self.versions(scopes(**kwargs))
+                entry = self.get(key, versions)
+                if entry is None:
+                    response = current_app.make_response(view(**kwargs))
+                    if response.status_code != 200:
+                        return response
+                    headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+                    entry = self.put(key, versions, response.get_data(), response.status_code, headers)
+
+                if entry.etag in request.headers.get("If-None-Match", ""):
+                    with self._lock:
+                        self.not_modified += 1
+                    return Response(status=304, headers={"ETag": entry.etag})
+                return Response(entry.body, status=entry.status,
+                                headers={**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"})
+            return wrapper
+        return decorator
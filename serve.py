@@ -0,0 +1,46 @@
+"""Production entry point for the Flask API.
+
+    python3 serve.py --threads 16 --port 8000
+
+Serves app.py with waitress: one process, a pool of worker threads. The
+tracker thread, camera, OLED worker and the in-memory state (latest photo,
+status events, leaderboard, response cache) are process-local, so the API is
+deliberately not forked into several worker processes; threads are enough
+because requests spend their time waiting on the database or on events.
+Streaming endpoints (/stream, /events, /events/poll) keep one thread each
+while a client is connected. At most --threads minus 4 of them are open at
+once (app.API_RESERVED_THREADS), and further ones get 503 with Retry-After,
+so viewers cannot starve /status and /rank. A client that disconnects frees
+its slot at the next write (at most one keepalive later). Size --threads
+for the expected viewers plus API traffic.
+"""
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--threads", type=int, default=16, help="worker threads serving requests")
+    parser.add_argument("--connection-limit", type=int, default=100)
+    parser.add_argument("--no-device", action="store_true",
+                        help="do not open the camera / OLED (API only, e.g. for load tests)")
+    args = parser.parse_args()
+
+    # app.py 依 thread 數決定 Mongo 連線池大小，要在 import 前設定
+    os.environ["FOCUSMATE_THREADS"] = str(args.threads)
+    import app
+    from waitress import serve
+
+    if not args.no_device:
+        app.start_device()
+    print(f"Serving on {args.host}:{args.port} with {args.threads} threads ({app.storage.name} storage)")
+    # channel_request_lookahead：request 還在跑時也讀 socket，串流的 client 斷線馬上知道，
+    # 下一次寫入就結束，名額 (MAX_SUBSCRIBERS) 跟 thread 才會放出來
+    serve(app.app, host=args.host, port=args.port, threads=args.threads,
+          connection_limit=args.connection_limit, channel_timeout=120, channel_request_lookahead=1)
+
+
+if __name__ == '__main__':
+    main()
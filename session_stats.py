@@ -0,0 +1,87 @@
+"""Per-session focus analytics over columnar telemetry.
+
+Input is three parallel arrays as stored by face_tracking/telemetry.py:
+timestamps (s), status codes and scores. Telemetry stores the code of every
+frame next to the status string, so no string handling is needed at query
+time; encode_statuses() converts old rows that only have the string.
+Everything is done with NumPy on the whole arrays: each frame is weighted by
+the time to the next frame, and the status stream is run-length encoded to
+get streaks and interruptions. Consecutive distraction states (looking away,
+then picking up the phone) count as one episode; an interruption is an
+episode of at least `min_interruption_s` right after focused time. A multi-hour session at 10+ fps takes
+milliseconds (bench/bench_session_stats.py).
+"""
+import numpy as np
+
+from face_tracking.status_codes import (
+    ABSENT, FOCUSED, HEAD_DOWN, LOOKING_AWAY, OTHER, PHONE, SLEEPING, STATE_NAMES, STATUS_CODES,
+)
+
+DISTRACTED = np.array([PHONE, SLEEPING, HEAD_DOWN, LOOKING_AWAY, ABSENT])
+
+MAX_FRAME_GAP = 1.0        # 超過這個間隔（斷線、暫停）只算 MAX_FRAME_GAP 秒
+MIN_INTERRUPTION_S = 1.0   # 短於這個長度的分心不算一次中斷
+
+
+def encode_statuses(statuses):
+    """Status strings -> uint8 codes. Only the distinct strings are looked up."""
+    uniques, inverse = np.unique(np.asarray(statuses, dtype=object).astype(str), return_inverse=True)
+    lookup = np.array([STATUS_CODES.get(s, OTHER) for s in uniques], dtype=np.uint8)
+    return lookup[inverse] if len(uniques) else np.empty(0, np.uint8)
+
+
+def run_lengths(codes):
+    """Returns (starts, ends, values) of the runs of equal consecutive codes."""
+    codes = np.asarray(codes)
+    if codes.size == 0:
+        empty = np.empty(0, np.intp)
+        return empty, empty, codes[:0]
+    starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+    ends = np.append(starts[1:], codes.size)
+    return starts, ends, codes[starts]
+
+
+def frame_durations(ts, max_gap=MAX_FRAME_GAP):
+    """Seconds each frame stands for: time until the next frame, capped at max_gap."""
+    ts = np.asarray(ts, dtype=np.float64)
+    if ts.size < 2:
+        return np.zeros(ts.size)
+    dt = np.diff(ts)
+    dt = np.append(dt, np.median(dt))
+    return np.clip(dt, 0.0, max_gap)
+
+
+def session_stats(ts, codes, scores, max_gap=MAX_FRAME_GAP, min_interruption_s=MIN_INTERRUPTION_S):
+    ts = np.asarray(ts, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.uint8)
+    scores = np.asarray(scores, dtype=np.float64)
+    n = ts.size
+
+    dt = frame_durations(ts, max_gap)
+    state_seconds = np.bincount(codes, weights=dt, minlength=len(STATE_NAMES))
+    tracked = dt.sum()
+
+    starts, ends, values = run_lengths(codes)
+    elapsed = np.concatenate(([0.0], np.cumsum(dt)))
+    run_seconds = elapsed[ends] - elapsed[starts]
+
+    focused_runs = run_seconds[values == FOCUSED]
+    # 中斷：專注之後接著一段夠長的分心；連續的不同分心狀態合成一段再算長度
+    kind = np.where(codes == FOCUSED, 0, np.where(np.isin(codes, DISTRACTED), 1, 2))
+    ep_starts, ep_ends, ep_kinds = run_lengths(kind)
+    ep_seconds = elapsed[ep_ends] - elapsed[ep_starts]
+    distracted = (ep_kinds == 1) & (ep_seconds >= min_interruption_s)
+    interruptions = int(np.count_nonzero(distracted[1:] & (ep_kinds[:-1] == 0)))
+
+    return {
+        "frames": int(n),
+        "duration_s": float(ts[-1] - ts[0]) if n else 0.0,
+        "tracked_s": float(tracked),
+        "focused_s": float(state_seconds[FOCUSED]),
+        "focused_ratio": float(state_seconds[FOCUSED] / tracked) if tracked else 0.0,
+        "state_seconds": {name: float(s) for name, s in zip(STATE_NAMES, state_seconds)},
+        "longest_focus_s": float(focused_runs.max()) if focused_runs.size else 0.0,
+        "interruptions": interruptions,
+        "mean_score": float(np.average(scores, weights=dt)) if tracked else
+                      (float(scores.mean()) if n else 0.0),
+    }
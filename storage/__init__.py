@@ -0,0 +1,20 @@
+"""Storage backends for app.py: MongoDB, on-device SQLite, or SQLite replicated to MongoDB."""
+from storage.base import Storage, calculate_level
+
+BACKENDS = ("mongo", "sqlite", "sqlite+mongo")
+
+
+def create_storage(kind, sqlite_path="focusmate.db", mongo_uri=None, mongo_db="focusmate_db", **mongo_options):
+    # pymongo 只在用到時才 import，純 SQLite 不需要
+    if kind == "mongo":
+        from storage.mongo import MongoStorage
+        return MongoStorage(mongo_uri, mongo_db, **mongo_options)
+    if kind == "sqlite":
+        from storage.sqlite import SQLiteStorage
+        return SQLiteStorage(sqlite_path)
+    if kind == "sqlite+mongo":
+        from storage.mongo import MongoStorage
+        from storage.replicated import ReplicatedStorage
+        from storage.sqlite import SQLiteStorage
+        return ReplicatedStorage(SQLiteStorage(sqlite_path), MongoStorage(mongo_uri, mongo_db, **mongo_options))
+    raise ValueError(f"unknown storage backend {kind!r}, expected one of {BACKENDS}")
@@ -0,0 +1,94 @@
+"""Storage interface used by app.py.
+
+Times are the "YYYY-MM-DDTHH:MM:SS" (UTC+8) strings the app already uses,
+so they sort and compare as strings. Session ids are whatever the backend
+uses natively (ObjectId, integer); the HTTP layer only ever sees str(id) and
+hands it back through parse_session_id().
+"""
+import math
+
+
+def calculate_level(score):
+    return math.floor((-1 + math.sqrt(1 + 0.16 * score)) / 2)
+
+
+class Storage:
+    name = "storage"
+
+    def ping(self):
+        """Raise if the backend is unreachable."""
+
+    def ensure_indexes(self):
+        pass
+
+    def close(self):
+        pass
+
+    # --- users ---
+    def get_user(self, username, recent=None):
+        """User with `scores` and `sessions` ({start_time, end_time}, oldest first).
+
+        `recent` keeps only the last N of both. None if there is no such user.
+        """
+        raise NotImplementedError
+
+    def list_users(self):
+        """All users without the scores / sessions history."""
+        raise NotImplementedError
+
+    def usernames(self):
+        raise NotImplementedError
+
+    def score_rows(self):
+        """(username, score) for every user, for the leaderboard."""
+        raise NotImplementedError
+
+    def append_score(self, username, value):
+        """Append a session score, keep score / level up to date. Returns the new total or None."""
+        raise NotImplementedError
+
+    # --- sessions ---
+    def start_session(self, username, start_time):
+        """Create the user if needed and open a session. Returns the session id."""
+        raise NotImplementedError
+
+    def stop_session(self, username, end_time, stats=None):
+        """Close the user's open session. Returns False if there was none."""
+        raise NotImplementedError
+
+    def list_sessions(self, username, start_from=None, start_to=None, offset=0, limit=50):
+        """Sessions newest first, start_time in [start_from, start_to)."""
+        raise NotImplementedError
+
+    def parse_session_id(self, text):
+        """str -> native session id; ValueError if malformed."""
+        raise NotImplementedError
+
+    def get_session(self, session_id):
+        """{"username", "end_time", "analytics"} or None."""
+        raise NotImplementedError
+
+    def save_analytics(self, session_id, analytics):
+        raise NotImplementedError
+
+    # --- telemetry ---
+    def write_telemetry(self, rows):
+        """Bulk insert rows from face_tracking/telemetry.py.
+
+        A failed batch is retried with the same row dicts, so a retry after a
+        partial write must not fail on (or duplicate) the rows already written.
+        """
+        raise NotImplementedError
+
+    def load_telemetry(self, session_id):
+        """Returns (timestamps, scores, status codes) ordered by time."""
+        raise NotImplementedError
+
+    # --- maintenance ---
+    def reconcile_scores(self):
+        """Recompute score / level from the scores history. Returns (checked, fixed)."""
+        raise NotImplementedError
+
+    def migrate_sessions(self):
+        """Move legacy embedded sessions out of user documents. Returns (users, sessions)."""
+        return 0, 0
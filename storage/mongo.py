@@ -0,0 +1,269 @@
+"""MongoDB (Atlas) storage: users, sessions and telemetry collections."""
+import numpy as np
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from face_tracking.status_codes import status_code
+from storage.base import Storage, calculate_level
+
+DUPLICATE_KEY = 11000
+
+
+class MongoStorage(Storage):
+    name = "mongo"
+
+    def __init__(self, uri, db_name="focusmate_db", **client_options):
+        self.client = MongoClient(uri, **client_options)
+        db = self.client[db_name]
+        self.users = db['users']
+        self.sessions = db['sessions']    # 一個 session 一筆，不再塞在 user 文件裡
+        self.telemetry = db['telemetry']  # 每一幀的 (ts, score, status, state, phone)
+
+    def ping(self):
+        self.client.admin.command('ping')
+
+    def ensure_indexes(self):
+        self.users.create_index([("username", 1)])
+        self.users.create_index([("score", -1)])
+        self.sessions.create_index([("username", 1), ("start_time", 1)])
+        self.sessions.create_index([("legacy_key", 1)], unique=True, sparse=True)
+        self.telemetry.create_index([("session_id", 1), ("ts", 1)])
+
+    def close(self):
+        self.client.close()
+
+    # --- users ---
+    @staticmethod
+    def _with_totals(user):
+        """舊資料可能還沒有 score / level，回傳時補上（不寫回，交給 reconcile）。"""
+        user['_id'] = str(user['_id'])
+        user.pop("open_session", None)
+        if "score" not in user:
+            user["score"] = sum(user.get("scores", []))
+        if "level" not in user:
+            user["level"] = calculate_level(user["score"])
+        return user
+
+    def get_user(self, username, recent=None):
+        user = self.users.find_one({"username": username})
+        if user is None:
+            return None
+        if "sessions" not in user:  # 已搬到 sessions collection
+            user["sessions"] = self._load_sessions(username, recent)
+        else:
+            # 還沒 migrate-sessions 的舊文件：陣列 + 之後新開的 session
+            user["sessions"] += self._load_sessions(username)
+            if recent is not None:
+                user["sessions"] = user["sessions"][-recent:] if recent > 0 else []
+        if recent is not None:
+            user["scores"] = user.get("scores", [])[-recent:] if recent > 0 else []
+        return self._with_totals(user)
+
+    def list_users(self):
+        # 不帶 scores / sessions 陣列，單一查詢；舊資料沒有 score 時在 DB 端加總
+        users = self.users.aggregate([
+            {"$addFields": {"score": {"$ifNull": ["$score", {"$sum": "$scores"}]}}},
+            {"$project": {"scores": 0, "sessions": 0, "open_session": 0}},
+        ])
+        return [self._with_totals(user) for user in users]
+
+    def usernames(self):
+        return [user["username"] for user in self.users.find({}, {"_id": 0, "username": 1})]
+
+    def score_rows(self):
+        rows = self.users.find({}, {"_id": 0, "username": 1, "score": 1}).sort("score", -1)
+        return [(user["username"], user.get("score", 0)) for user in rows]
+
+    def append_score(self, username, value):
+        user = self.users.find_one_and_update(
+            {"username": username},
+            {
+                "$push": {"scores": value},
+                "$inc": {"score": value}
+            },
+            projection={"score": 1, "level": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if user is None:
+            return None
+
+        level = calculate_level(user["score"])
+        if user.get("level") != level:
+            self.users.update_one({"_id": user["_id"]}, {"$set": {"level": level}})
+        return user["score"]
+
+    # --- sessions ---
+    def start_session(self, username, start_time):
+        # 若沒有這個 user，建立新資料
+        self.users.update_one(
+            {"username": username},
+            {
+                "$setOnInsert": {
+                    "username": username,
+                    "score": 0,
+                    "level": calculate_level(0),
+                    "scores": [],
+                }
+            },
+            upsert=True
+        )
+
+        new_session = {"username": username, "start_time": start_time, "end_time": None}
+        session_id = self.sessions.insert_one(new_session).inserted_id
+
+        # 進行中的 session 記在 user 上，結束時直接用 _id 找，不用掃
+        self.users.update_one(
+            {"username": username},
+            {"$set": {"open_session": session_id}}
+        )
+        return session_id
+
+    def stop_session(self, username, end_time, stats=None):
+        user = self.users.find_one_and_update(
+            {"username": username, "open_session": {"$ne": None}},
+            {"$set": {"open_session": None}},
+            projection={"open_session": 1}
+        )
+        if user is None:
+            # 還沒 migrate-sessions 的舊文件
+            result = self.users.update_one(
+                {"username": username, "sessions": {"$elemMatch": {"end_time": None}}},
+                {"$set": {"sessions.$.end_time": end_time}}
+            )
+            return result.modified_count > 0
+
+        update = {"end_time": end_time}
+        if stats is not None:
+            update["stats"] = stats
+        result = self.sessions.update_one(
+            {"_id": user["open_session"]},
+            {"$set": update}
+        )
+        return result.modified_count > 0
+
+    def _load_sessions(self, username, recent=None):
+        cursor = self.sessions.find(
+            {"username": username}, {"start_time": 1, "end_time": 1}
+        ).sort([("start_time", -1), ("_id", -1)])
+        if recent is not None:
+            if recent <= 0:
+                return []
+            cursor = cursor.limit(recent)
+        sessions = [{"start_time": s["start_time"], "end_time": s["end_time"]} for s in cursor]
+        sessions.reverse()
+        return sessions
+
+    def list_sessions(self, username, start_from=None, start_to=None, offset=0, limit=50):
+        query = {"username": username}
+        start_range = {}
+        if start_from:
+            start_range["$gte"] = start_from
+        if start_to:
+            start_range["$lt"] = start_to
+        if start_range:
+            query["start_time"] = start_range
+
+        cursor = self.sessions.find(query).sort([("start_time", -1), ("_id", -1)]).skip(offset).limit(limit)
+        return [{"id": str(s["_id"]), "start_time": s["start_time"],
+                 "end_time": s["end_time"], "stats": s.get("stats")} for s in cursor]
+
+    def parse_session_id(self, text):
+        try:
+            return ObjectId(text)
+        except (InvalidId, TypeError) as e:
+            raise ValueError(str(e)) from None
+
+    def get_session(self, session_id):
+        return self.sessions.find_one({"_id": session_id}, {"_id": 0, "analytics": 1, "end_time": 1, "username": 1})
+
+    def save_analytics(self, session_id, analytics):
+        self.sessions.update_one({"_id": session_id}, {"$set": {"analytics": analytics}})
+
+    # --- telemetry ---
+    def write_telemetry(self, rows):
+        # insert_many 會在 rows 上補 _id；同一批重試時已寫入的列是 duplicate key，當作成功
+        try:
+            self.telemetry.insert_many(rows, ordered=False)
+        except BulkWriteError as e:
+            errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+            if errors or e.details.get("writeConcernErrors"):
+                raise
+
+    def load_telemetry(self, session_id, batch_size=10000):
+        # 幾小時的 session 有幾十萬筆，不能 $group 成一份文件 (16 MB 上限)：
+        # 用 (session_id, ts) 索引依序讀，一批一批填進預先配置的陣列
+        query = {"session_id": session_id}
+        n = self.telemetry.count_documents(query)
+        ts, scores = np.empty(n, np.float64), np.empty(n, np.float64)
+        codes = np.empty(n, np.uint8)
+        index = [("session_id", 1), ("ts", 1)]
+        cursor = self.telemetry.find(query, {"_id": 0, "ts": 1, "score": 1, "state": 1},
+                                     batch_size=batch_size).sort("ts", 1).hint(index)
+        i = 0
+        legacy = False
+        for row in cursor:
+            if i == ts.size:
+                # 讀的時候又寫進來的
+                ts, scores, codes = (np.resize(a, max(16, 2 * a.size)) for a in (ts, scores, codes))
+            ts[i], scores[i] = row["ts"], row["score"]
+            if "state" in row:
+                codes[i] = row["state"]
+            else:
+                legacy = True
+            i += 1
+        ts, scores, codes = ts[:i], scores[:i], codes[:i]
+        if legacy:
+            # 舊資料沒有 state 欄位，從 status 字串轉（同樣的排序再讀一次）
+            cursor = self.telemetry.find(query, {"_id": 0, "state": 1, "status": 1},
+                                         batch_size=batch_size).sort("ts", 1).hint(index).limit(i)
+            for j, row in enumerate(cursor):
+                if "state" not in row:
+                    codes[j] = status_code(row.get("status"))
+        return ts, scores, codes
+
+    # --- maintenance ---
+    def reconcile_scores(self, batch_size=500):
+        """依 scores 重算 score / level，只寫有差異的。"""
+        ops = []
+        checked = fixed = 0
+        for user in self.users.find({}, {"scores": 1, "score": 1, "level": 1}):
+            checked += 1
+            score = sum(user.get("scores", []))
+            level = calculate_level(score)
+            if user.get("score") != score or user.get("level") != level:
+                ops.append(UpdateOne({"_id": user["_id"]}, {"$set": {"score": score, "level": level}}))
+            if len(ops) >= batch_size:
+                fixed += self.users.bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            fixed += self.users.bulk_write(ops, ordered=False).modified_count
+        return checked, fixed
+
+    def migrate_sessions(self):
+        """user 文件裡的 sessions 陣列 -> sessions collection。
+
+        可以重跑：每個舊 session 用 (user _id, 陣列位置) 當 legacy_key upsert，
+        中途當掉再跑一次不會重複寫入。
+        """
+        migrated_users = migrated_sessions = 0
+        for user in self.users.find({"sessions": {"$exists": True}}, {"username": 1, "sessions": 1}):
+            keys = [f"{user['_id']}:{i}" for i in range(len(user["sessions"]))]
+            ops = [UpdateOne({"legacy_key": key},
+                             {"$setOnInsert": {"username": user["username"], "start_time": session.get("start_time"),
+                                               "end_time": session.get("end_time"), "legacy_key": key}},
+                             upsert=True)
+                   for key, session in zip(keys, user["sessions"])]
+            open_keys = [key for key, session in zip(keys, user["sessions"]) if session.get("end_time") is None]
+            if ops:
+                self.sessions.bulk_write(ops, ordered=False)
+            if open_keys:
+                open_session = self.sessions.find_one({"legacy_key": open_keys[-1]}, {"_id": 1})["_id"]
+                # 只在還沒有 open_session 時設定：部署後 start_session 寫的不能蓋掉
+                self.users.update_one({"_id": user["_id"], "open_session": {"$exists": False}},
+                                      {"$set": {"open_session": open_session}})
+            self.users.update_one({"_id": user["_id"]}, {"$unset": {"sessions": ""}})
+            migrated_users += 1
+            migrated_sessions += len(ops)
+        return migrated_users, migrated_sessions
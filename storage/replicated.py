@@ -0,0 +1,165 @@
+"""Local-first storage with asynchronous replication to a remote store.
+
+Reads and writes go to `local` (SQLite on the device), so requests never
+wait on the network. Every write is also queued and replayed against
+`remote` (MongoDB) by one background thread, in order. If the remote is
+unreachable the thread keeps retrying the same operation with backoff, so
+the device keeps working offline and catches up later. The queue lives in
+memory: writes still pending at shutdown are only in the local store.
+
+The remote id of every replicated session is saved next to the local
+session, so telemetry of a session that stays open across a restart still
+finds its remote session. Telemetry of a session whose start never reached
+the remote (still queued at shutdown) is only kept locally and counted in
+`unmapped`.
+"""
+import queue
+import threading
+
+from storage.base import Storage
+
+RETRY_MIN_S = 1.0
+RETRY_MAX_S = 60.0
+
+
+class ReplicatedStorage(Storage):
+    def __init__(self, local, remote, max_pending=100000):
+        self.local = local
+        self.remote = remote
+        self.name = f"{local.name}+{remote.name}"
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._session_ids = {}   # local session id -> remote session id (cache of local.remote_session_id)
+        self._closed = threading.Event()
+        self.replicated = 0
+        self.dropped = 0
+        self.unmapped = 0        # telemetry rows without a remote session
+        self._thread = threading.Thread(target=self._replicate_loop, name="storage-replicate", daemon=True)
+        self._thread.start()
+
+    def _enqueue(self, op, *args):
+        try:
+            self._pending.put_nowait((op, args))
+        except queue.Full:
+            self.dropped += 1
+
+    def _apply(self, op, args):
+        if op == "start_session":
+            local_id, username, start_time = args
+            remote_id = self.remote.start_session(username, start_time)
+            self.local.save_remote_session_id(local_id, remote_id)
+            self._session_ids[local_id] = remote_id
+        elif op == "telemetry":
+            batch = args[0]
+            if batch["remote"] is None:
+                # 只轉換一次：重試時送出同一批 dict，remote 補上的 _id 不會變
+                ids = {sid: self._remote_session_id(sid) for sid in {row["session_id"] for row in batch["rows"]}}
+                rows = [{**row, "session_id": ids[row["session_id"]]} for row in batch["rows"]]
+                batch["remote"] = [row for row in rows if row["session_id"] is not None]
+                if len(batch["remote"]) < len(rows):
+                    self.unmapped += len(rows) - len(batch["remote"])
+                    print(f"Replication: {len(rows) - len(batch['remote'])} telemetry rows have no remote session")
+            if batch["remote"]:
+                self.remote.write_telemetry(batch["remote"])
+        else:
+            getattr(self.remote, op)(*args)
+
+    def _remote_session_id(self, local_id):
+        if local_id not in self._session_ids:
+            # 重開機前開的 session：對應存在本地資料庫
+            remote_id = self.local.remote_session_id(local_id)
+            if remote_id is None:
+                return None
+            self._session_ids[local_id] = self.remote.parse_session_id(remote_id)
+        return self._session_ids[local_id]
+
+    def _replicate_loop(self):
+        delay = RETRY_MIN_S
+        while not self._closed.is_set():
+            try:
+                op, args = self._pending.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            while not self._closed.is_set():
+                try:
+                    self._apply(op, args)
+                    self.replicated += 1
+                    delay = RETRY_MIN_S
+                    break
+                except Exception as e:
+                    print(f"Replication of {op} failed, retrying in {delay:.0f}s: {e}")
+                    self._closed.wait(delay)
+                    delay = min(delay * 2, RETRY_MAX_S)
+
+    @property
+    def pending(self):
+        return self._pending.qsize()
+
+    def ping(self):
+        self.local.ping()
+
+    def ensure_indexes(self):
+        self.local.ensure_indexes()
+        try:
+            self.remote.ensure_indexes()
+        except Exception as e:
+            print(f"Remote storage unavailable, replicating later: {e}")
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+        self.local.close()
+        self.remote.close()
+
+    # --- reads: local only ---
+    def get_user(self, username, recent=None):
+        return self.local.get_user(username, recent)
+
+    def list_users(self):
+        return self.local.list_users()
+
+    def usernames(self):
+        return self.local.usernames()
+
+    def score_rows(self):
+        return self.local.score_rows()
+
+    def list_sessions(self, username, start_from=None, start_to=None, offset=0, limit=50):
+        return self.local.list_sessions(username, start_from, start_to, offset, limit)
+
+    def parse_session_id(self, text):
+        return self.local.parse_session_id(text)
+
+    def get_session(self, session_id):
+        return self.local.get_session(session_id)
+
+    def save_analytics(self, session_id, analytics):
+        # 由 telemetry 算出來的快取，不用同步
+        self.local.save_analytics(session_id, analytics)
+
+    def load_telemetry(self, session_id):
+        return self.local.load_telemetry(session_id)
+
+    def reconcile_scores(self):
+        return self.local.reconcile_scores()
+
+    # --- writes: local first, then queued for the remote ---
+    def append_score(self, username, value):
+        score = self.local.append_score(username, value)
+        if score is not None:
+            self._enqueue("append_score", username, value)
+        return score
+
+    def start_session(self, username, start_time):
+        session_id = self.local.start_session(username, start_time)
+        self._enqueue("start_session", session_id, username, start_time)
+        return session_id
+
+    def stop_session(self, username, end_time, stats=None):
+        stopped = self.local.stop_session(username, end_time, stats)
+        if stopped:
+            self._enqueue("stop_session", username, end_time, stats)
+        return stopped
+
+    def write_telemetry(self, rows):
+        self.local.write_telemetry(rows)
+        self._enqueue("telemetry", {"rows": rows, "remote": None})
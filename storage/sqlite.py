@@ -0,0 +1,229 @@
+"""On-device SQLite storage (WAL mode), usable offline.
+
+One connection per thread; WAL lets the Flask threads read while the
+telemetry flusher writes. Writes that touch several rows run in a
+BEGIN IMMEDIATE transaction so concurrent writers queue instead of failing.
+"""
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from storage.base import Storage, calculate_level
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id           INTEGER PRIMARY KEY,
+    username     TEXT NOT NULL UNIQUE,
+    score        NUMERIC NOT NULL DEFAULT 0,
+    level        INTEGER NOT NULL DEFAULT 0,
+    open_session INTEGER
+);
+CREATE INDEX IF NOT EXISTS users_score ON users (score DESC);
+
+CREATE TABLE IF NOT EXISTS scores (
+    id       INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    value    NUMERIC NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_username ON scores (username, id);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id         INTEGER PRIMARY KEY,
+    username   TEXT NOT NULL,
+    start_time TEXT NOT NULL,
+    end_time   TEXT,
+    stats      TEXT,
+    analytics  TEXT,
+    remote_id  TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_username_start ON sessions (username, start_time);
+
+CREATE TABLE IF NOT EXISTS telemetry (
+    session_id INTEGER NOT NULL,
+    ts         REAL NOT NULL,
+    score      REAL NOT NULL,
+    status     TEXT,
+    state      INTEGER NOT NULL,
+    phone      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS telemetry_session_ts ON telemetry (session_id, ts);
+"""
+
+
+def _json(text):
+    return json.loads(text) if text else None
+
+
+class SQLiteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, path="focusmate.db"):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: 交易由 _write() 自己控制
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def ping(self):
+        self._conn().execute("SELECT 1")
+
+    def ensure_indexes(self):
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # 舊的資料庫檔沒有 remote_id 欄位
+        if "remote_id" not in {row["name"] for row in conn.execute("PRAGMA table_info(sessions)")}:
+            conn.execute("ALTER TABLE sessions ADD COLUMN remote_id TEXT")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- users ---
+    def get_user(self, username, recent=None):
+        conn = self._conn()
+        user = conn.execute("SELECT id, username, score, level FROM users WHERE username = ?",
+                            (username,)).fetchone()
+        if user is None:
+            return None
+        if recent is not None and recent <= 0:
+            scores, sessions = [], []
+        else:
+            limit = -1 if recent is None else recent
+            scores = [row[0] for row in conn.execute(
+                "SELECT value FROM scores WHERE username = ? ORDER BY id DESC LIMIT ?", (username, limit))]
+            sessions = [{"start_time": row[0], "end_time": row[1]} for row in conn.execute(
+                "SELECT start_time, end_time FROM sessions WHERE username = ? "
+                "ORDER BY start_time DESC, id DESC LIMIT ?", (username, limit))]
+            scores.reverse()
+            sessions.reverse()
+        return {"_id": str(user["id"]), "username": user["username"], "score": user["score"],
+                "level": user["level"], "scores": scores, "sessions": sessions}
+
+    def list_users(self):
+        return [{"_id": str(row["id"]), "username": row["username"], "score": row["score"], "level": row["level"]}
+                for row in self._conn().execute("SELECT id, username, score, level FROM users ORDER BY id")]
+
+    def usernames(self):
+        return [row[0] for row in self._conn().execute("SELECT username FROM users ORDER BY id")]
+
+    def score_rows(self):
+        return [tuple(row) for row in self._conn().execute(
+            "SELECT username, score FROM users ORDER BY score DESC")]
+
+    def append_score(self, username, value):
+        with self._write() as conn:
+            row = conn.execute("SELECT score FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None:
+                return None
+            score = row[0] + value
+            conn.execute("INSERT INTO scores (username, value) VALUES (?, ?)", (username, value))
+            conn.execute("UPDATE users SET score = ?, level = ? WHERE username = ?",
+                         (score, calculate_level(score), username))
+        return score
+
+    # --- sessions ---
+    def start_session(self, username, start_time):
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO users (username, score, level) VALUES (?, 0, ?)",
+                         (username, calculate_level(0)))
+            session_id = conn.execute(
+                "INSERT INTO sessions (username, start_time) VALUES (?, ?)", (username, start_time)).lastrowid
+            conn.execute("UPDATE users SET open_session = ? WHERE username = ?", (session_id, username))
+        return session_id
+
+    def stop_session(self, username, end_time, stats=None):
+        with self._write() as conn:
+            row = conn.execute("SELECT open_session FROM users WHERE username = ?", (username,)).fetchone()
+            if row is None or row[0] is None:
+                return False
+            conn.execute("UPDATE users SET open_session = NULL WHERE username = ?", (username,))
+            conn.execute("UPDATE sessions SET end_time = ?, stats = ? WHERE id = ?",
+                         (end_time, json.dumps(stats) if stats is not None else None, row[0]))
+        return True
+
+    def list_sessions(self, username, start_from=None, start_to=None, offset=0, limit=50):
+        sql = "SELECT id, start_time, end_time, stats FROM sessions WHERE username = ?"
+        params = [username]
+        if start_from:
+            sql += " AND start_time >= ?"
+            params.append(start_from)
+        if start_to:
+            sql += " AND start_time < ?"
+            params.append(start_to)
+        sql += " ORDER BY start_time DESC, id DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        return [{"id": str(row["id"]), "start_time": row["start_time"], "end_time": row["end_time"],
+                 "stats": _json(row["stats"])} for row in self._conn().execute(sql, params)]
+
+    def parse_session_id(self, text):
+        return int(text)
+
+    def get_session(self, session_id):
+        row = self._conn().execute("SELECT username, end_time, analytics FROM sessions WHERE id = ?",
+                                   (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {"username": row["username"], "end_time": row["end_time"], "analytics": _json(row["analytics"])}
+
+    def save_analytics(self, session_id, analytics):
+        with self._write() as conn:
+            conn.execute("UPDATE sessions SET analytics = ? WHERE id = ?", (json.dumps(analytics), session_id))
+
+    # 同步到 remote 時對應的 session id (ReplicatedStorage 用)，重開機後還在
+    def save_remote_session_id(self, session_id, remote_id):
+        with self._write() as conn:
+            conn.execute("UPDATE sessions SET remote_id = ? WHERE id = ?", (str(remote_id), session_id))
+
+    def remote_session_id(self, session_id):
+        row = self._conn().execute("SELECT remote_id FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    # --- telemetry ---
+    def write_telemetry(self, rows):
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT INTO telemetry (session_id, ts, score, status, state, phone) VALUES (?, ?, ?, ?, ?, ?)",
+                [(row["session_id"], row["ts"], row["score"], row["status"], row["state"], int(row["phone"]))
+                 for row in rows])
+
+    def load_telemetry(self, session_id):
+        rows = self._conn().execute(
+            "SELECT ts, score, state FROM telemetry WHERE session_id = ? ORDER BY ts", (session_id,)).fetchall()
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 3)
+        return columns[:, 0], columns[:, 1], columns[:, 2].astype(np.uint8)
+
+    # --- maintenance ---
+    def reconcile_scores(self):
+        with self._write() as conn:
+            checked = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            stale = conn.execute(
+                "SELECT u.username, COALESCE(SUM(s.value), 0) FROM users u "
+                "LEFT JOIN scores s ON s.username = u.username "
+                "GROUP BY u.id HAVING u.score != COALESCE(SUM(s.value), 0)").fetchall()
+            conn.executemany("UPDATE users SET score = ?, level = ? WHERE username = ?",
+                             [(score, calculate_level(score), username) for username, score in stale])
+        return checked, len(stale)